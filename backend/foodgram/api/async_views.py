@@ -0,0 +1,236 @@
+"""Асинхронные view чтения для режима ASGI.
+
+При ASGI_MODE списки и карточки тегов, ингредиентов и рецептов отдают
+эти view вместо ViewSet из views.py: база читается асинхронным ORM, и
+воркер не держит поток на время запроса. Ответ строится теми же
+кешами, фильтрами и сериализаторами, а запрос проходит через сам
+ViewSet: его согласование формата (Accept и ?format=), аутентификаторы,
+права, троттлинг, обработку ошибок и рендереры. Остальные методы и режим
+курсора передаются ViewSet.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.urls import path
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from foodgram.constants import INGREDIENTS_SEARCH_LIMIT
+from recipes.caches import ingredient_index, tag_catalog
+from users.models import Follow
+
+from . import recipe_cache
+from .filters import IngredientFilter
+from .paginations import RecipePagination, alist
+from .serializers import RecipeSerializer
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class TokenKey(TokenAuthentication):
+    """Разбор заголовка Authorization без обращения к базе."""
+
+    def authenticate_credentials(self, key):
+        return key, None
+
+
+async def authenticate_token(request):
+    credentials = TokenKey().authenticate(request)
+    if credentials is None:
+        return None
+    token = await Token.objects.select_related('user').filter(
+        key=credentials[0]).afirst()
+    if token is None:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    return token.user, token
+
+
+async def authenticate(request):
+    """Аутентификация аутентификаторами ViewSet, как в Request.user.
+
+    TokenAuthentication читает токен асинхронным ORM, остальные
+    аутентификаторы выполняются в потоке.
+    """
+    request.user, request.auth = AnonymousUser(), None
+    for authenticator in request.authenticators:
+        if type(authenticator) is TokenAuthentication:
+            user_auth = await authenticate_token(request)
+        else:
+            user_auth = await sync_to_async(authenticator.authenticate)(
+                request)
+        if user_auth is not None:
+            request.user, request.auth = user_auth
+            return
+
+
+async def initial(view, request, *args, **kwargs):
+    """APIView.initial с асинхронной аутентификацией."""
+    view.format_kwarg = view.get_format_suffix(**kwargs)
+    (request.accepted_renderer,
+     request.accepted_media_type) = view.perform_content_negotiation(request)
+    request.version, request.versioning_scheme = view.determine_version(
+        request, *args, **kwargs)
+    await authenticate(request)
+    view.check_permissions(request)
+    view.check_throttles(request)
+
+
+async def render(response):
+    """Рендерит Response в обычный HttpResponse.
+
+    Django рендерит ответы с методом render в потоке, поэтому ответ
+    отдаётся уже готовым. В потоке рендерится только не-JSON, например
+    Browsable API, которому нужна база.
+    """
+    if not isinstance(response, Response):
+        return response
+    if isinstance(response.accepted_renderer, JSONRenderer):
+        response.render()
+    else:
+        await sync_to_async(response.render)()
+    return HttpResponse(response.content, status=response.status_code,
+                        headers=dict(response.items()))
+
+
+def read_view(fallback, handles=None):
+    """Асинхронный view для GET и HEAD; прочие запросы идут в fallback.
+
+    fallback — view из ViewSet.as_view(). Обработчик получает экземпляр
+    ViewSet с действием fallback для GET и возвращает Response. cls и
+    actions копируются, чтобы метрики и журнал медленных запросов видели
+    то же имя view.
+    """
+
+    def decorator(handler):
+        sync_fallback = sync_to_async(fallback)
+
+        @wraps(handler)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS or (
+                    handles is not None and not handles(request)):
+                return await sync_fallback(request, *args, **kwargs)
+            view = fallback.cls(**fallback.initkwargs)
+            view.action_map = fallback.actions
+            view.args, view.kwargs = args, kwargs
+            request = view.initialize_request(request, *args, **kwargs)
+            view.request = request
+            view.action = fallback.actions['get']
+            view.headers = view.default_response_headers
+            try:
+                await initial(view, request, *args, **kwargs)
+                response = await handler(view, request, *args, **kwargs)
+            except Exception as error:
+                response = view.handle_exception(error)
+            return await render(view.finalize_response(
+                request, response, *args, **kwargs))
+
+        wrapper.csrf_exempt = True
+        wrapper.cls = fallback.cls
+        wrapper.initkwargs = fallback.initkwargs
+        wrapper.actions = fallback.actions
+        return wrapper
+
+    return decorator
+
+
+async def subscriptions(user, author_ids):
+    return {pk async for pk in Follow.objects.filter(
+        follower=user, recipe_author_id__in=author_ids
+    ).values_list('recipe_author_id', flat=True)}
+
+
+@read_view(TagViewSet.as_view({'get': 'list'}))
+async def tag_list(view, request):
+    version, modified = await tag_catalog.astamp()
+    etag = quote_etag(version)
+    last_modified = int(modified.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(tag_catalog.all(await tag_catalog.adata()))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+@read_view(TagViewSet.as_view({'get': 'retrieve'}))
+async def tag_detail(view, request, pk):
+    tag = tag_catalog.get(pk, await tag_catalog.adata())
+    if tag is None:
+        raise exceptions.NotFound
+    return Response(tag)
+
+
+@read_view(IngredientViewSet.as_view({'get': 'list'}))
+async def ingredient_list(view, request):
+    data = await ingredient_index.adata()
+    name = request.query_params.get(IngredientFilter.search_param, '')
+    if name.strip():
+        return Response(ingredient_index.search(
+            name.strip(), INGREDIENTS_SEARCH_LIMIT, data))
+    return Response(ingredient_index.all(data))
+
+
+@read_view(IngredientViewSet.as_view({'get': 'retrieve'}))
+async def ingredient_detail(view, request, pk):
+    ingredient = ingredient_index.get(pk, await ingredient_index.adata())
+    if ingredient is None:
+        raise exceptions.NotFound
+    return Response(ingredient)
+
+
+@read_view(RecipeViewSet.as_view({'get': 'list', 'post': 'create'}),
+           handles=lambda request: (RecipePagination.cursor_query_param
+                                    not in request.GET))
+async def recipe_list(view, request):
+    # Проверка фильтров может читать базу (автор), а FilterSet синхронный.
+    queryset = await sync_to_async(view.filter_queryset)(
+        view.get_queryset())
+    page = await view.paginator.apaginate_queryset(queryset, request)
+    context = view.get_serializer_context()
+    if request.user.is_authenticated:
+        context['subscriptions'] = await subscriptions(
+            request.user, {recipe.author_id for recipe in page})
+    data = RecipeSerializer(page, many=True, context=context).data
+    return view.paginator.get_paginated_response(data)
+
+
+@read_view(RecipeViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update',
+                                  'delete': 'destroy'}))
+async def recipe_detail(view, request, pk):
+    state = await recipe_cache.recipe_state(request.user).filter(
+        pk=pk).afirst()
+    if state is None:
+        raise exceptions.NotFound
+
+    async def build():
+        recipes = await alist(view.get_shared_queryset().filter(pk=pk))
+        if not recipes:
+            raise exceptions.NotFound
+        return view.serialize_shared(recipes[0])
+
+    data = await recipe_cache.aget_or_build(
+        recipe_cache.cache_key(request, pk, state['updated_at']), build)
+    return Response(
+        recipe_cache.apply_user_fields(data, state, request.user))
+
+
+urlpatterns = [
+    path('tags/', tag_list),
+    path('tags/<int:pk>/', tag_detail),
+    path('ingredients/', ingredient_list),
+    path('ingredients/<int:pk>/', ingredient_detail),
+    path('recipes/', recipe_list),
+    path('recipes/<int:pk>/', recipe_detail),
+]
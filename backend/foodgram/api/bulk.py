@@ -0,0 +1,68 @@
+"""Пакетное добавление и удаление связей пользователя с объектами.
+
+Строка пользователя блокируется на время операции, поэтому параллельные
+запросы того же пользователя не меняют набор связей между чтением и
+записью, и список изменённых id точен.
+"""
+from django.db import transaction
+
+from users.models import User
+
+CREATED = 'created'
+EXISTS = 'exists'
+DELETED = 'deleted'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+
+
+def lock_user(user_id):
+    list(User.objects.select_for_update().filter(pk=user_id)
+         .order_by().values_list('pk', flat=True))
+
+
+def linked_ids(model, owner_field, target_field, owner_id, target_ids):
+    return set(model.objects.filter(**{
+        owner_field: owner_id, f'{target_field}__in': target_ids
+    }).values_list(target_field, flat=True))
+
+
+@transaction.atomic
+def add_links(model, owner_field, target_field, owner_id, target_ids,
+              valid_ids, invalid_ids=()):
+    """Создаёт связи одним INSERT и возвращает id новых и статусы."""
+    lock_user(owner_id)
+    linked = linked_ids(model, owner_field, target_field, owner_id,
+                        target_ids)
+    created = [pk for pk in target_ids
+               if pk in valid_ids and pk not in linked]
+    model.objects.bulk_create(
+        [model(**{owner_field: owner_id, target_field: pk})
+         for pk in created],
+        ignore_conflicts=True)
+    results = []
+    for pk in target_ids:
+        if pk in invalid_ids:
+            status = INVALID
+        elif pk not in valid_ids:
+            status = NOT_FOUND
+        else:
+            status = EXISTS if pk in linked else CREATED
+        results.append({'id': pk, 'status': status})
+    return created, results
+
+
+@transaction.atomic
+def remove_links(model, owner_field, target_field, owner_id, target_ids):
+    """Удаляет связи одним DELETE и возвращает id удалённых и статусы."""
+    lock_user(owner_id)
+    linked = linked_ids(model, owner_field, target_field, owner_id,
+                        target_ids)
+    model.objects.filter(**{
+        owner_field: owner_id, f'{target_field}__in': linked
+    }).delete()
+    return (
+        [pk for pk in target_ids if pk in linked],
+        [{'id': pk, 'status': DELETED if pk in linked else ABSENT}
+         for pk in target_ids],
+    )
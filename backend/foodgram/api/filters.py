@@ -1,7 +1,14 @@
+from django.db.models import F
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import OrderingFilter, SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.caches import tag_catalog
+from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
+
+
+def tag_choices():
+    return tag_catalog.choices()
 
 
 class IngredientFilter(SearchFilter):
@@ -12,21 +19,44 @@ class IngredientFilter(SearchFilter):
         fields = ('name',)
 
 
+class StableOrderingFilter(OrderingFilter):
+    """Сортировка ?ordering= с id в конце, чтобы страницы не пересекались."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            ordering = (*ordering, 'id')
+        return ordering
+
+
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all())
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags')
+    tags_all = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags')
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         fields = ('tags',
-                  'author')
+                  'tags_all',
+                  'author',
+                  'search')
         model = Recipe
 
+    def filter_tags(self, queryset, name, value):
+        mask = tag_catalog.mask(value)
+        matched = f'{name}_matched'
+        queryset = queryset.alias(**{matched: F('tags_mask').bitand(mask)})
+        if name == 'tags_all':
+            return queryset.filter(**{matched: mask})
+        return queryset.exclude(**{matched: 0})
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
@@ -38,3 +68,8 @@ class RecipeFilter(FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(shopping_cart__user=user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
@@ -0,0 +1,314 @@
+import gc
+import json
+import shutil
+import tempfile
+from collections import defaultdict, namedtuple
+from math import ceil
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from rest_framework.test import APIClient
+
+from api import urls
+from api.samples import IMAGE, LOCMEM_CACHES
+from recipes import images
+from recipes.caches import ingredient_index, tag_catalog
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+# Маршруты, которые не замеряются: их время определяет хеширование
+# пароля или отправка писем, а не запросы к базе.
+SKIPPED = {
+    ('login', 'POST'), ('logout', 'POST'),
+    ('users-list', 'POST'),
+    ('users-me', 'PUT'), ('users-me', 'PATCH'), ('users-me', 'DELETE'),
+    ('users-detail', 'PUT'), ('users-detail', 'PATCH'),
+    ('users-detail', 'DELETE'),
+    ('users-activation', 'POST'), ('users-resend-activation', 'POST'),
+    ('users-reset-password', 'POST'),
+    ('users-reset-password-confirm', 'POST'),
+    ('users-reset-username', 'POST'),
+    ('users-reset-username-confirm', 'POST'),
+    ('users-set-password', 'POST'), ('users-set-username', 'POST'),
+}
+
+Case = namedtuple('Case', 'route method query path data auth label',
+                  defaults=('', None, None, True, None))
+
+
+def api_routes(patterns=urls.urlpatterns):
+    """Все пары (имя маршрута, метод) из api/urls.py."""
+    routes = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            routes |= api_routes(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            actions = getattr(pattern.callback, 'actions', None)
+            view_class = getattr(pattern.callback, 'cls', None)
+            if view_class is None:
+                methods = ['get']
+            else:
+                methods = [
+                    method for method in view_class.http_method_names
+                    if (method in actions if actions
+                        else hasattr(view_class, method))
+                ]
+            routes |= {(pattern.name, method.upper()) for method in methods
+                       if method not in ('head', 'options')}
+    return routes
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = ('Замер времени и числа запросов всех эндпоинтов API на '
+            'нескольких объёмах данных со сравнением с базовой линией.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', default=('100:500',
+                                                            '1000:5000'),
+                            help='Объёмы данных: пользователи:рецепты')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Количество замеров каждого запроса')
+        parser.add_argument('--baseline', type=Path,
+                            default=settings.BASE_DIR
+                            / 'benchmark_baseline.json',
+                            help='Файл с базовой линией этой машины')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Записать результаты как базовую линию')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Допустимый рост p95, доля от базовой')
+        parser.add_argument('--slack-ms', type=float, default=5,
+                            help='Допустимый рост p95 в миллисекундах')
+
+    def handle(self, *args, **options):
+        scales = {}
+        for scale in options['scales']:
+            try:
+                users, recipes = map(int, scale.split(':'))
+            except ValueError:
+                raise CommandError(f'Неверный объём данных: {scale}.')
+            scales[scale] = users, recipes
+        work_dir = tempfile.mkdtemp()
+        test_settings = connection.settings_dict['TEST']
+        test_name = test_settings['NAME']
+        if connection.vendor == 'sqlite':
+            # База в памяти переживает destroy_test_db, поэтому каждый
+            # объём данных замеряется на своём файле.
+            test_settings['NAME'] = str(Path(work_dir) / 'benchmark.sqlite3')
+        results = {}
+        try:
+            with override_settings(
+                    CACHES=LOCMEM_CACHES, MEDIA_ROOT=work_dir,
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for scale, (users, recipes) in scales.items():
+                    results[scale] = self.run_scale(users, recipes,
+                                                    options['repeat'])
+        finally:
+            test_settings['NAME'] = test_name
+            shutil.rmtree(work_dir, ignore_errors=True)
+        self.report(results)
+        baseline = Path(options['baseline'])
+        # Время зависит от машины, поэтому базовая линия своя у каждой
+        # машины и в репозиторий не входит: первый запуск её записывает.
+        if options['update_baseline'] or not baseline.is_file():
+            baseline.write_text(json.dumps(
+                results, indent=2, sort_keys=True, ensure_ascii=False))
+            self.stdout.write(f'Базовая линия записана в {baseline}.')
+            return
+        self.compare(results, json.loads(baseline.read_text()),
+                     options['tolerance'], options['slack_ms'])
+
+    def run_scale(self, users, recipes, repeat):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cache.clear()
+            data = settings.BASE_DIR / 'data'
+            call_command('load_ingredients', path=data / 'ingredients.csv',
+                         stdout=self.stderr)
+            call_command('load_tags', path=data / 'tags.csv',
+                         stdout=self.stderr)
+            call_command('seed_perf_data', users=users, recipes=recipes,
+                         stdout=self.stderr)
+            ingredient_index.invalidate()
+            tag_catalog.invalidate()
+            reader = (User.objects.filter(shopping_cart__isnull=False)
+                      .annotate(follows=Count('follower'))
+                      .order_by('-follows', 'pk').first())
+            return self.run_cases(reader, list(self.cases(reader)), repeat)
+        finally:
+            images.executor.submit(lambda: None).result()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    @staticmethod
+    def cases(reader):
+        recipe = Recipe.objects.order_by('-favorites_count', 'pk').first()
+        free_recipes = list(
+            Recipe.objects.exclude(favorites__user=reader)
+            .exclude(shopping_cart__user=reader)
+            .order_by('pk').values_list('pk', flat=True)[:10])
+        free_authors = list(
+            User.objects.exclude(recipeauthor__follower=reader)
+            .exclude(pk=reader.pk)
+            .order_by('pk').values_list('pk', flat=True)[:10])
+        ingredient = Ingredient.objects.order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        new_recipe = {
+            'ingredients': [{'id': ingredient.pk, 'amount': 100}],
+            'tags': [tag.pk], 'image': IMAGE, 'name': 'Замер',
+            'text': 'Описание', 'cooking_time': 10,
+        }
+
+        def url(route, *args):
+            return reverse(f'api:{route}', args=args)
+
+        yield Case('api-root', 'GET', path=url('api-root'))
+        yield Case('metrics', 'GET', path=url('metrics'))
+        yield Case('users-list', 'GET', path=url('users-list'))
+        yield Case('users-list', 'GET', '?ordering=-followers_count',
+                   url('users-list'))
+        yield Case('users-detail', 'GET', path=url('users-detail',
+                                                   recipe.author_id))
+        yield Case('users-me', 'GET', path=url('users-me'))
+        yield Case('users-subscriptions', 'GET',
+                   path=url('users-subscriptions'))
+        yield Case('users-subscriptions', 'GET', '?cursor=',
+                   url('users-subscriptions'))
+        yield Case('ingredients-list', 'GET', path=url('ingredients-list'))
+        yield Case('ingredients-list', 'GET', '?name=мо',
+                   url('ingredients-list'))
+        yield Case('ingredients-detail', 'GET',
+                   path=url('ingredients-detail', ingredient.pk))
+        yield Case('tags-list', 'GET', path=url('tags-list'))
+        yield Case('tags-detail', 'GET', path=url('tags-detail', tag.pk))
+        yield Case('recipes-list', 'GET', path=url('recipes-list'),
+                   auth=False)
+        for query in ('', f'?tags={tag.slug}', '?is_favorited=1',
+                      '?is_in_shopping_cart=1', '?search=молоко',
+                      '?ordering=-favorites_count', '?cursor='):
+            yield Case('recipes-list', 'GET', query, url('recipes-list'))
+        yield Case('recipes-list', 'GET', f'?author={recipe.author_id}',
+                   url('recipes-list'), label='GET recipes-list?author=')
+        yield Case('recipes-detail', 'GET',
+                   path=url('recipes-detail', recipe.pk))
+        yield Case('recipes-download-shopping-cart', 'GET', '?format=txt',
+                   url('recipes-download-shopping-cart'))
+        for route, target, bulk_route, bulk_ids in (
+                ('recipes-favorite', free_recipes[0], 'recipes-favorite-bulk',
+                 free_recipes),
+                ('recipes-shopping-cart', free_recipes[0],
+                 'recipes-shopping-cart-bulk', free_recipes),
+                ('users-subscribe', free_authors[0],
+                 'users-subscriptions-bulk', free_authors)):
+            for method in ('POST', 'DELETE'):
+                yield Case(route, method, path=url(route, target))
+            for method in ('POST', 'DELETE'):
+                yield Case(bulk_route, method, path=url(bulk_route),
+                           data={'ids': bulk_ids})
+        yield Case('recipes-list', 'POST', path=url('recipes-list'),
+                   data=new_recipe)
+        yield Case('recipes-detail', 'PATCH',
+                   path=lambda state: url('recipes-detail', state['id']),
+                   data={**new_recipe, 'name': 'Замер 2'})
+        yield Case('recipes-detail', 'DELETE',
+                   path=lambda state: url('recipes-detail', state['id']))
+
+    def run_cases(self, reader, cases, repeat):
+        missing = api_routes() - SKIPPED - {
+            (case.route, case.method) for case in cases}
+        if missing:
+            raise CommandError(f'Не замеряются маршруты: {sorted(missing)}')
+        client = APIClient()
+        anonymous = APIClient()
+        client.force_authenticate(reader)
+        timings, queries = defaultdict(list), defaultdict(int)
+        state = {}
+        for iteration in range(repeat + 1):
+            gc.collect()
+            for case in cases:
+                path = case.path(state) if callable(case.path) else case.path
+                response, elapsed, captured = self.request(
+                    client if case.auth else anonymous, case, path)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{case.method} {path}{case.query}: ответ '
+                        f'{response.status_code}.')
+                if case.method == 'POST' and case.route == 'recipes-list':
+                    state['id'] = response.data['id']
+                if iteration:
+                    label = self.label(case)
+                    timings[label].append(elapsed * 1000)
+                    queries[label] = max(queries[label], len(captured))
+        return {
+            label: {
+                'queries': queries[label],
+                'p50_ms': round(percentile(values, 50), 2),
+                'p95_ms': round(percentile(values, 95), 2),
+            }
+            for label, values in timings.items()
+        }
+
+    @staticmethod
+    def request(client, case, path):
+        """Выполняет запрос с выключенным сборщиком мусора."""
+        gc.disable()
+        try:
+            with CaptureQueriesContext(connection) as captured:
+                started = perf_counter()
+                response = client.generic(
+                    case.method, path + case.query,
+                    json.dumps(case.data) if case.data else '',
+                    content_type='application/json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = perf_counter() - started
+        finally:
+            gc.enable()
+        return response, elapsed, captured
+
+    @staticmethod
+    def label(case):
+        label = case.label or f'{case.method} {case.route}{case.query}'
+        return label if case.auth else f'{label} (аноним)'
+
+    def report(self, results):
+        for scale, cases in results.items():
+            self.stdout.write(f'Объём {scale}:')
+            for label, result in cases.items():
+                self.stdout.write(
+                    f'  {label:<55} {result["queries"]:>4} запр. '
+                    f'p50 {result["p50_ms"]:>8.2f} мс '
+                    f'p95 {result["p95_ms"]:>8.2f} мс')
+
+    def compare(self, results, baseline, tolerance, slack_ms):
+        regressions = []
+        for scale, cases in results.items():
+            for label, result in cases.items():
+                base = baseline.get(scale, {}).get(label)
+                if base is None:
+                    continue
+                if result['queries'] > base['queries']:
+                    regressions.append(
+                        f'{scale} {label}: запросов {result["queries"]} '
+                        f'вместо {base["queries"]}')
+                limit = base['p95_ms'] * (1 + tolerance) + slack_ms
+                if result['p95_ms'] > limit:
+                    regressions.append(
+                        f'{scale} {label}: p95 {result["p95_ms"]} мс, '
+                        f'допустимо {limit:.2f} мс')
+        if regressions:
+            raise CommandError('Регрессии производительности:\n'
+                               + '\n'.join(regressions))
+        self.stdout.write('Регрессий относительно базовой линии нет.')
@@ -0,0 +1,214 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.client import HTTPConnection
+from pathlib import Path
+from time import perf_counter, sleep
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from api.management.commands.benchmark_api import percentile
+from recipes.models import Recipe
+from users.models import User
+
+MODES = {'wsgi': 'False', 'asgi': 'True'}
+
+
+def read_paths(recipe_id):
+    """Запросы чтения, которые под ASGI обслуживают асинхронные view."""
+    return [
+        '/api/tags/',
+        '/api/ingredients/?' + urlencode({'name': 'мо'}),
+        '/api/recipes/',
+        '/api/recipes/?' + urlencode({'limit': 20, 'page': 2}),
+        f'/api/recipes/{recipe_id}/',
+    ]
+
+
+def run_load(port, headers, paths, concurrency, duration):
+    """Гоняет запросы в concurrency потоков, каждый на новом соединении.
+
+    Соединение не переиспользуется, как и между nginx и backend.
+    Возвращает длительности успешных запросов и число ошибок.
+    """
+    latencies, errors = [], []
+    deadline = perf_counter() + duration
+
+    def client(offset):
+        index = offset
+        while perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            started = perf_counter()
+            connection = HTTPConnection('127.0.0.1', port, timeout=30)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except OSError:
+                ok = False
+            finally:
+                connection.close()
+            if ok:
+                latencies.append(perf_counter() - started)
+            else:
+                errors.append(path)
+
+    threads = [threading.Thread(target=client, args=(number,))
+               for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors)
+
+
+class Command(BaseCommand):
+    help = ('Сравнение пропускной способности чтения тегов, ингредиентов и '
+            'рецептов под gunicorn в режимах WSGI и ASGI на текущей базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES,
+                            default=list(MODES), help='Режимы сервера')
+        parser.add_argument('--concurrency', nargs='+', type=int,
+                            default=(1, 16, 64),
+                            help='Числа одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность замера, секунды')
+        parser.add_argument('--warmup', type=float, default=2,
+                            help='Прогрев перед замерами, секунды')
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Число воркеров gunicorn')
+        parser.add_argument('--port', type=int, default=8765,
+                            help='Порт сервера')
+        parser.add_argument('--username',
+                            help='Запросы от имени этого пользователя')
+
+    def handle(self, *args, **options):
+        recipe = Recipe.objects.order_by('-favorites_count', 'pk').first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов: сначала выполните '
+                               'seed_perf_data.')
+        paths = read_paths(recipe.pk)
+        hosts = [host for host in settings.ALLOWED_HOSTS
+                 if host and '*' not in host and not host.startswith('.')]
+        headers = {'Host': hosts[0] if hosts else 'localhost'}
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь {options["username"]} не найден.')
+            token, _ = Token.objects.get_or_create(user=user)
+            headers['Authorization'] = f'Token {token.key}'
+        results = {}
+        for mode in options['modes']:
+            with GunicornServer(mode, options['port'], options['workers'],
+                                self.stderr):
+                run_load(options['port'], headers, paths,
+                         max(options['concurrency']), options['warmup'])
+                for concurrency in options['concurrency']:
+                    latencies, errors = run_load(
+                        options['port'], headers, paths, concurrency,
+                        options['duration'])
+                    results[mode, concurrency] = self.summary(
+                        latencies, errors, options['duration'])
+        self.report(results, options['modes'], options['concurrency'])
+
+    @staticmethod
+    def summary(latencies, errors, duration):
+        if not latencies:
+            return {'rps': 0.0, 'p50_ms': None, 'p95_ms': None,
+                    'errors': errors}
+        return {
+            'rps': round(len(latencies) / duration, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'errors': errors,
+        }
+
+    def report(self, results, modes, concurrencies):
+        for concurrency in concurrencies:
+            self.stdout.write(f'Клиентов: {concurrency}')
+            for mode in modes:
+                result = results[mode, concurrency]
+                latency = (f'p50 {result["p50_ms"]:>8.2f} мс '
+                           f'p95 {result["p95_ms"]:>8.2f} мс'
+                           if result['p50_ms'] is not None else 'нет ответов')
+                self.stdout.write(
+                    f'  {mode:<5} {result["rps"]:>9.1f} запр./с  {latency}  '
+                    f'ошибок {result["errors"]}')
+            if set(MODES) <= set(modes) and results['wsgi', concurrency][
+                    'rps']:
+                ratio = (results['asgi', concurrency]['rps']
+                         / results['wsgi', concurrency]['rps'])
+                self.stdout.write(f'  asgi/wsgi: {ratio:.2f}')
+
+
+class GunicornServer:
+    """gunicorn с gunicorn.conf.py в отдельном процессе на время замера."""
+
+    def __init__(self, mode, port, workers, log):
+        self.mode = mode
+        self.port = port
+        self.workers = workers
+        self.log = log
+
+    def __enter__(self):
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.output = open(Path(self.work_dir.name) / 'gunicorn.log', 'w+')
+        env = {
+            **os.environ,
+            'ASGI_MODE': MODES[self.mode],
+            'PROMETHEUS_MULTIPROC_DIR': str(
+                Path(self.work_dir.name) / 'metrics'),
+        }
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn',
+             '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+             '--bind', f'127.0.0.1:{self.port}',
+             '--workers', str(self.workers)],
+            cwd=settings.BASE_DIR, env=env, stdout=self.output,
+            stderr=subprocess.STDOUT)
+        try:
+            self.wait_ready()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        self.log.write(f'{self.mode}: gunicorn запущен, '
+                       f'воркеров {self.workers}.')
+        return self
+
+    def wait_ready(self, timeout=30):
+        deadline = perf_counter() + timeout
+        while perf_counter() < deadline:
+            if self.process.poll() is not None:
+                self.output.seek(0)
+                raise CommandError(f'{self.mode}: gunicorn завершился:\n'
+                                   + self.output.read()[-2000:])
+            connection = HTTPConnection('127.0.0.1', self.port, timeout=1)
+            try:
+                connection.request('GET', '/api/tags/')
+                connection.getresponse().read()
+                return
+            except OSError:
+                sleep(0.2)
+            finally:
+                connection.close()
+        raise CommandError(f'{self.mode}: gunicorn не ответил за '
+                           f'{timeout} с.')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.output.close()
+        self.work_dir.cleanup()
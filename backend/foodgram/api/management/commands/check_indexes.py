@@ -0,0 +1,122 @@
+import re
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.views import RecipeViewSet
+from recipes.models import Favorites, Ingredient, IngredientAmount, ShoppingCart
+from users.models import Follow, User
+
+FULL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'^SCAN (\w+)(?: AS \w+)?$'),
+}
+
+# Индексы, которых нет в состоянии моделей: миграции создают их SQL
+# для каждого вендора.
+RAW_INDEXES = {
+    'recipes_ingredient': ('ingredient_name_prefix_idx',),
+}
+
+
+def missing_indexes():
+    """Индексы из RAW_INDEXES, которых нет в базе, в виде таблица.индекс."""
+    missing = []
+    with connection.cursor() as cursor:
+        for table, names in RAW_INDEXES.items():
+            existing = connection.introspection.get_constraints(cursor, table)
+            missing.extend(f'{table}.{name}' for name in names
+                           if name not in existing)
+    return missing
+
+
+def full_scans(plan, vendor):
+    """Таблицы, которые план читает целиком, без индекса."""
+    pattern = FULL_SCAN[vendor]
+    return [match.group(1) for match in map(pattern.search,
+                                            plan.splitlines()) if match]
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах планировщик выбирает полный просмотр,
+            # даже когда подходящий индекс есть.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '\n'.join(row[-1] for row in cursor.fetchall())
+
+
+def recipe_list(user, **params):
+    """Запрос списка рецептов так, как его строит RecipeViewSet.list."""
+    request = Request(APIRequestFactory().get('/', params))
+    request.user = user
+    view = RecipeViewSet(request=request, action='list', format_kwarg=None,
+                         kwargs={})
+    return view.filter_queryset(view.get_queryset())
+
+
+def canonical_queries():
+    user = User(pk=1)
+    return {
+        'Лента рецептов': recipe_list(user)[:6],
+        # Фильтр ?author= проверяет, что автор есть в базе, а условие в
+        # запросе даёт то же самое.
+        'Рецепты автора': recipe_list(user).filter(author_id=1)[:6],
+        'Избранное пользователя': recipe_list(user, is_favorited=1)[:6],
+        'Корзина пользователя': recipe_list(user, is_in_shopping_cart=1)[:6],
+        'Проверка избранного': Favorites.objects.filter(
+            user_id=1, recipe_id=1),
+        'Проверка корзины': ShoppingCart.objects.filter(
+            user_id=1, recipe_id=1),
+        'Подписки пользователя': Follow.objects.filter(
+            follower_id=1).order_by('recipe_author_id'),
+        'Авторы в подписках': User.objects.filter(
+            recipeauthor__follower=1).order_by('username', 'id'),
+        'Поиск ингредиента по префиксу': Ingredient.objects.filter(
+            name__istartswith='мо'),
+        'Состав рецептов из корзины': IngredientAmount.objects.filter(
+            recipe_id__in=[1, 2, 3]).values_list('ingredient_id')
+        .annotate(total=Sum('amount')).order_by(),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Проверка планов основных запросов API: каждая таблица '
+            'должна читаться по индексу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', action='store_true',
+                            help='Показать планы запросов')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCAN:
+            raise CommandError(
+                f'Проверка не поддерживает базу {connection.vendor}.')
+        missing = missing_indexes()
+        for name in missing:
+            self.stdout.write(f'Нет индекса: {name}')
+        failed = []
+        for name, queryset in canonical_queries().items():
+            plan = explain(queryset)
+            scans = full_scans(plan, connection.vendor)
+            status = ('без индекса: ' + ', '.join(scans)) if scans else 'ок'
+            self.stdout.write(f'{name}: {status}')
+            if options['plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+            if scans:
+                failed.append(name)
+        errors = []
+        if missing:
+            errors.append('Нет индексов: ' + ', '.join(missing))
+        if failed:
+            errors.append('Запросы без индекса: ' + ', '.join(failed))
+        if errors:
+            raise CommandError('. '.join(errors))
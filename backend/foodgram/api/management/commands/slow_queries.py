@@ -0,0 +1,65 @@
+import json
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Отпечатки медленных SQL-запросов из журнала, отсортированные '
+            'по общему времени.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', type=Path,
+                            default=Path(settings.SLOW_QUERY_LOG),
+                            help='Файл журнала медленных запросов')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Количество отпечатков в отчёте')
+        parser.add_argument('--view', help='Только запросы этого view')
+        parser.add_argument('--plans', action='store_true',
+                            help='Показать последний план каждого отпечатка')
+
+    @staticmethod
+    def read_records(path):
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден.')
+        stats = defaultdict(lambda: {
+            'count': 0, 'total': 0.0, 'max': 0.0, 'views': Counter(),
+            'sql': '', 'plan': None})
+        for record in self.read_records(path):
+            if options['view'] and record['view'] != options['view']:
+                continue
+            item = stats[record['fingerprint']]
+            item['count'] += 1
+            item['total'] += record['duration_ms']
+            item['max'] = max(item['max'], record['duration_ms'])
+            item['views'][record['view']] += 1
+            item['sql'] = record['sql']
+            item['plan'] = record['plan'] or item['plan']
+        if not stats:
+            self.stdout.write('Медленных запросов нет.')
+            return
+        ranked = sorted(stats.items(), key=lambda pair: -pair[1]['total'])
+        for place, (key, item) in enumerate(ranked[:options['limit']], 1):
+            views = ', '.join(f'{view} ({count})' for view, count
+                              in item['views'].most_common(3))
+            self.stdout.write(
+                f'{place}. {key}: всего {item["total"]:.1f} мс, '
+                f'{item["count"]} раз, в среднем '
+                f'{item["total"] / item["count"]:.1f} мс, '
+                f'максимум {item["max"]:.1f} мс\n'
+                f'   view: {views}\n'
+                f'   {item["sql"]}')
+            if options['plans'] and item['plan']:
+                for line in item['plan'].splitlines():
+                    self.stdout.write(f'     {line}')
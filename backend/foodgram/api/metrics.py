@@ -0,0 +1,158 @@
+"""Метрики запросов в формате Prometheus.
+
+Middleware считает для каждого view и действия время ответа, число и
+время SQL-запросов и размер ответа, а также отдаёт заголовок
+Server-Timing. Если задана переменная PROMETHEUS_MULTIPROC_DIR, каждый
+воркер gunicorn пишет значения в свои файлы в этом каталоге, и
+/api/metrics/ суммирует их по всем воркерам.
+"""
+import os
+from time import perf_counter
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+LABELS = ('view', 'method')
+
+REQUESTS = Counter(
+    'foodgram_requests', 'Число запросов.', LABELS + ('status',))
+LATENCY = Histogram(
+    'foodgram_request_duration_seconds', 'Время ответа.', LABELS,
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+QUERIES = Histogram(
+    'foodgram_request_queries', 'Число SQL-запросов на запрос.', LABELS,
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200))
+SQL_TIME = Histogram(
+    'foodgram_request_sql_seconds', 'Время SQL-запросов на запрос.', LABELS,
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes', 'Размер тела ответа.', LABELS,
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+
+UNRESOLVED = 'unresolved'
+
+
+def view_name(request, view_func):
+    """Имя view с действием: RecipeViewSet.list, TokenCreateView.post."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return request.resolver_match.view_name or view_func.__qualname__
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class RequestMetrics:
+    def __init__(self, request):
+        self.method = request.method
+        self.view = UNRESOLVED
+        self.status = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.size = 0
+        self.started = perf_counter()
+        self.connections = connections.all()
+        for connection in self.connections:
+            connection.execute_wrappers.append(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += perf_counter() - started
+
+    def server_timing(self):
+        return (f'app;dur={(perf_counter() - self.started) * 1000:.1f}, '
+                f'db;dur={self.sql_time * 1000:.1f};'
+                f'desc="{self.queries} queries"')
+
+    def count_stream(self, content):
+        try:
+            for chunk in content:
+                self.size += len(chunk)
+                yield chunk
+        finally:
+            self.finish()
+
+    async def acount_stream(self, content):
+        try:
+            async for chunk in content:
+                self.size += len(chunk)
+                yield chunk
+        finally:
+            self.finish()
+
+    def finish(self):
+        for connection in self.connections:
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+        labels = {'view': self.view, 'method': self.method}
+        REQUESTS.labels(status=self.status, **labels).inc()
+        LATENCY.labels(**labels).observe(perf_counter() - self.started)
+        QUERIES.labels(**labels).observe(self.queries)
+        SQL_TIME.labels(**labels).observe(self.sql_time)
+        RESPONSE_SIZE.labels(**labels).observe(self.size)
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса; должен стоять первым в MIDDLEWARE.
+
+    Для потоковых ответов размер и время учитываются после отдачи
+    последнего куска, а Server-Timing показывает время до начала отдачи.
+    Под ASGI соединения с базой принадлежат потоку, в котором
+    sync_to_async выполняет запросы, поэтому счётчик подключается из него.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.metrics = metrics = RequestMetrics(request)
+        return self.finish(metrics, self.get_response(request))
+
+    async def __acall__(self, request):
+        request.metrics = metrics = await sync_to_async(RequestMetrics)(
+            request)
+        return self.finish(metrics, await self.get_response(request))
+
+    @staticmethod
+    def finish(metrics, response):
+        metrics.status = response.status_code
+        response['Server-Timing'] = metrics.server_timing()
+        if not response.streaming:
+            metrics.size = len(response.content)
+            metrics.finish()
+        elif response.is_async:
+            response.streaming_content = metrics.acount_stream(
+                response.streaming_content)
+        else:
+            response.streaming_content = metrics.count_stream(
+                response.streaming_content)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics.view = view_name(request, view_func)
+
+
+def metrics_view(request):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
@@ -1,6 +1,277 @@
+import json
+from base64 import b64decode, b64encode
+from functools import reduce
+from hashlib import md5
+from operator import or_
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import (EmptyPage, InvalidPage, Page,
+                                   PageNotAnInteger, Paginator)
+from django.db import connections
+from django.db.models import Q, prefetch_related_objects
+from django.utils.functional import cached_property
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.constants import MAX_PAGE_SIZE
+
+
+async def alist(queryset):
+    """Список объектов queryset через асинхронный ORM.
+
+    В Django 4.2 асинхронная итерация не поддерживает prefetch_related,
+    поэтому связанные объекты догружаются синхронно в потоке запроса.
+    """
+    lookups = queryset._prefetch_related_lookups
+    objects = [obj async for obj in queryset.prefetch_related(None)]
+    if lookups:
+        await sync_to_async(prefetch_related_objects)(objects, *lookups)
+    return objects
 
 
 class LimitPageNumberPagination(pagination.PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class SlicedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который кеширует количество объектов.
+
+    Ключ кеша строится из SQL запроса без сортировки и аннотаций, так что
+    одинаковые фильтры дают один ключ. На PostgreSQL при оценке планировщика
+    больше COUNT_ESTIMATE_THRESHOLD точный COUNT(*) не выполняется.
+    Страница и наличие следующей определяются выборкой на одну строку
+    больше, поэтому устаревший count не обрезает результаты.
+
+    Асинхронные view вызывают aload_count() и apage(): после них count и
+    num_pages берутся из уже посчитанного значения без обращения к базе.
+    """
+
+    def count_query(self):
+        queryset = self.object_list.order_by().values('pk')
+        sql = str(queryset.query)
+        return queryset, 'count:{}:{}'.format(
+            queryset.db, md5(sql.encode('utf-8')).hexdigest())
+
+    @cached_property
+    def count_info(self):
+        try:
+            queryset, key = self.count_query()
+        except EmptyResultSet:
+            return 0, True
+        info = cache.get(key)
+        if info is None:
+            info = self.estimate(queryset)
+            cache.set(key, info, settings.COUNT_CACHE_TIMEOUT)
+        return info
+
+    async def aload_count(self):
+        if 'count_info' in self.__dict__:
+            return
+        try:
+            queryset, key = self.count_query()
+        except EmptyResultSet:
+            self.count_info = 0, True
+            return
+        info = await cache.aget(key)
+        if info is None:
+            info = await self.aestimate(queryset)
+            await cache.aset(key, info, settings.COUNT_CACHE_TIMEOUT)
+        self.count_info = info
+
+    @staticmethod
+    def estimate(queryset):
+        if connections[queryset.db].vendor == 'postgresql':
+            plan = json.loads(queryset.explain(format='json'))
+            rows = plan[0]['Plan']['Plan Rows']
+            if rows > settings.COUNT_ESTIMATE_THRESHOLD:
+                return rows, False
+        return queryset.count(), True
+
+    @staticmethod
+    async def aestimate(queryset):
+        if connections[queryset.db].vendor == 'postgresql':
+            plan = json.loads(await queryset.aexplain(format='json'))
+            rows = plan[0]['Plan']['Plan Rows']
+            if rows > settings.COUNT_ESTIMATE_THRESHOLD:
+                return rows, False
+        return await queryset.acount(), True
+
+    @cached_property
+    def count(self):
+        return self.count_info[0]
+
+    @property
+    def count_exact(self):
+        return self.count_info[1]
+
+    def page_slice(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не является числом.')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1.')
+        bottom = (number - 1) * self.per_page
+        return number, self.object_list[bottom:bottom + self.per_page + 1]
+
+    def make_page(self, number, object_list):
+        if not object_list and number > 1:
+            raise EmptyPage('На этой странице нет результатов.')
+        return SlicedPage(object_list[:self.per_page], number, self,
+                          len(object_list) > self.per_page)
+
+    def page(self, number):
+        number, queryset = self.page_slice(number)
+        return self.make_page(number, list(queryset))
+
+    async def apage(self, number):
+        number, queryset = self.page_slice(number)
+        return self.make_page(number, await alist(queryset))
+
+
+class CachedCountPagination(LimitPageNumberPagination):
+    """Нумерация страниц с кешированным или оценочным count.
+
+    Поле ``count_exact`` в ответе говорит, точное ли количество.
+    """
+
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_exact'] = self.page.paginator.count_exact
+        return response
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset для асинхронных view, без режима курсора."""
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request))
+        await paginator.aload_count()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = await paginator.apage(page_number)
+        except InvalidPage as error:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(error)))
+        self.request = request
+        return list(self.page)
+
+
+class KeysetPagination(LimitPageNumberPagination):
+    """Постраничный вывод с опциональным режимом курсора.
+
+    Без параметра ``cursor`` работает как обычная нумерация страниц.
+    С ним (первая страница — ``?cursor=``) страница выбирается условием
+    по ключу ``ordering`` вместо OFFSET, а общее количество не считается.
+    Последнее поле ``ordering`` должно быть уникальным. Порядок в этом
+    режиме фиксирован и не зависит от параметра ``?ordering=``.
+    """
+
+    cursor_query_param = 'cursor'
+    ordering = None
+    use_cursor = False
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-'))
+                       for name in self.ordering]
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}'
+                        for name in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        self.next_position = self.previous_position = None
+        if results and (has_more or reverse):
+            self.next_position = self.get_position(results[-1])
+        if results and (has_more if reverse else position is not None):
+            self.previous_position = self.get_position(results[0])
+        return results
+
+    def after(self, ordering, position):
+        conditions = []
+        for index, name in enumerate(ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition = {self.fields[i].attname: position[i]
+                         for i in range(index)}
+            condition[f'{self.fields[index].attname}__{lookup}'] = (
+                position[index])
+            conditions.append(Q(**condition))
+        return reduce(or_, conditions)
+
+    def get_position(self, instance):
+        return [str(getattr(instance, field.attname))
+                for field in self.fields]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params[self.cursor_query_param]
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')))
+            if len(data['p']) != len(self.fields):
+                raise ValueError('Неверная длина позиции.')
+            position = [field.to_python(value)
+                        for field, value in zip(self.fields, data['p'])]
+            return position, bool(data['r'])
+        except (ValueError, TypeError, KeyError, ValidationError) as error:
+            raise NotFound(self.invalid_cursor_message) from error
+
+    def encode_cursor(self, position, reverse):
+        data = json.dumps({'p': position, 'r': int(reverse)})
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            b64encode(data.encode('utf-8')).decode('ascii'))
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': (self.encode_cursor(self.next_position, False)
+                     if self.next_position else None),
+            'previous': (self.encode_cursor(self.previous_position, True)
+                         if self.previous_position else None),
+            'results': data,
+        })
+
+
+class RecipePagination(KeysetPagination, CachedCountPagination):
+    ordering = ('-pub_date', 'name', 'id')
+
+
+class SubscriptionPagination(KeysetPagination):
+    ordering = ('username', 'id')
@@ -0,0 +1,126 @@
+"""Кеш общей для всех пользователей части ответа /api/recipes/{id}/.
+
+Ключ содержит Recipe.updated_at, поэтому любое сохранение рецепта
+делает старую запись недоступной. Изменение тега, ингредиента или
+автора сдвигает updated_at связанных рецептов (recipes/signals.py).
+Поля, зависящие от пользователя, подставляются поверх закешированного
+ответа.
+
+Блокировка, которая не даёт нескольким процессам строить одну запись,
+держится на cache.add и работает только с бэкендами, где add атомарен
+(см. CACHES в settings.py). С остальными каждый запрос строит запись сам.
+"""
+import asyncio
+from time import monotonic, sleep
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+from django.db.models import Exists, OuterRef
+
+from foodgram.constants import (RECIPE_CACHE_LOCK_TIMEOUT,
+                                RECIPE_CACHE_LOCK_WAIT,
+                                RECIPE_CACHE_TIMEOUT)
+from recipes.models import Favorites, Recipe, ShoppingCart
+from users.models import Follow
+
+USER_FIELDS = ('is_favorited', 'is_in_shopping_cart', 'is_subscribed')
+
+# Бэкенды, у которых cache.add атомарен; у файлового кеша add — это
+# has_key и затем set, и блокировку могут взять два процесса сразу.
+ATOMIC_ADD_BACKENDS = (RedisCache, BaseMemcachedCache, DatabaseCache,
+                       LocMemCache)
+
+
+def has_atomic_add():
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], ATOMIC_ADD_BACKENDS)
+
+
+def get_or_build(key, build, timeout=RECIPE_CACHE_TIMEOUT):
+    """Достаёт значение из кеша или строит его в одном процессе.
+
+    Остальные запросы с тем же ключом ждут, пока построивший положит
+    значение в кеш, и строят сами только по истечении блокировки.
+    """
+    data = cache.get(key)
+    if data is not None:
+        return data
+    if not has_atomic_add():
+        data = build()
+        cache.set(key, data, timeout)
+        return data
+    lock_key = f'{key}:lock'
+    deadline = monotonic() + RECIPE_CACHE_LOCK_TIMEOUT
+    while not cache.add(lock_key, True, RECIPE_CACHE_LOCK_TIMEOUT):
+        sleep(RECIPE_CACHE_LOCK_WAIT)
+        data = cache.get(key)
+        if data is not None:
+            return data
+        if monotonic() > deadline:
+            return build()
+    try:
+        data = build()
+        cache.set(key, data, timeout)
+    finally:
+        cache.delete(lock_key)
+    return data
+
+
+async def aget_or_build(key, build, timeout=RECIPE_CACHE_TIMEOUT):
+    """get_or_build для асинхронных view; build — корутинная функция."""
+    data = await cache.aget(key)
+    if data is not None:
+        return data
+    if not has_atomic_add():
+        data = await build()
+        await cache.aset(key, data, timeout)
+        return data
+    lock_key = f'{key}:lock'
+    deadline = monotonic() + RECIPE_CACHE_LOCK_TIMEOUT
+    while not await cache.aadd(lock_key, True, RECIPE_CACHE_LOCK_TIMEOUT):
+        await asyncio.sleep(RECIPE_CACHE_LOCK_WAIT)
+        data = await cache.aget(key)
+        if data is not None:
+            return data
+        if monotonic() > deadline:
+            return await build()
+    try:
+        data = await build()
+        await cache.aset(key, data, timeout)
+    finally:
+        await cache.adelete(lock_key)
+    return data
+
+
+def recipe_state(user):
+    queryset = Recipe.objects.all()
+    if user.is_authenticated:
+        queryset = queryset.annotate(
+            is_favorited=Exists(Favorites.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_subscribed=Exists(Follow.objects.filter(
+                follower=user, recipe_author=OuterRef('author'))),
+        )
+        return queryset.values('updated_at', 'author_id', *USER_FIELDS)
+    return queryset.values('updated_at')
+
+
+def cache_key(request, pk, updated_at):
+    # В ответе абсолютные ссылки на картинки: схема и хост входят в ключ.
+    return (f'recipe:{request.build_absolute_uri("/")}:{pk}:'
+            f'{updated_at.timestamp()}')
+
+
+def apply_user_fields(data, state, user):
+    if not user.is_authenticated:
+        return data
+    data['is_favorited'] = state['is_favorited']
+    data['is_in_shopping_cart'] = state['is_in_shopping_cart']
+    if data['author'] is not None:
+        data['author']['is_subscribed'] = (
+            state['is_subscribed'] and state['author_id'] != user.id)
+    return data
@@ -0,0 +1,229 @@
+import csv
+import json
+from itertools import chain, islice
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+SHOPPING_LIST_TITLE = 'Необходимые ингредиенты для покупки:'
+# Сколько частей ответа читать за один переход в синхронный поток.
+STREAM_BATCH = 100
+
+
+class FirstRendererFallback(DefaultContentNegotiation):
+    """Отдаёт первый рендерер, если Accept не подошёл ни к одному.
+
+    Список покупок раньше всегда отдавался текстом, и клиенты с
+    Accept: application/json должны получать его, а не 406. Неизвестный
+    ?format= по-прежнему даёт 404.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers,
+                                           format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+async def async_chunks(chunks):
+    """Асинхронный итератор поверх синхронного генератора.
+
+    Под ASGI Django целиком вычитывает синхронный итератор
+    StreamingHttpResponse в память; здесь части читаются пачками в
+    синхронном потоке запроса, где открыт курсор базы.
+    """
+    iterator = iter(chunks)
+    read_batch = sync_to_async(lambda: list(islice(iterator, STREAM_BATCH)))
+    while batch := await read_batch():
+        for chunk in batch:
+            yield chunk
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Ответы об ошибках рендерятся целиком, а сам список отдаётся
+    генератором ``stream``, который читает строки по одной.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    @staticmethod
+    def format_line(ingredient):
+        return (f'{ingredient["ingredient__name"]} '
+                f'{ingredient["amount"]}'
+                f'{ingredient["ingredient__measurement_unit"]}')
+
+    def stream(self, ingredients):
+        raise NotImplementedError
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield f'{SHOPPING_LIST_TITLE}\n'
+        for ingredient in ingredients:
+            yield f'{self.format_line(ingredient)}\n'
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Количество', 'Единица измерения')
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.header)
+        for ingredient in ingredients:
+            yield writer.writerow((ingredient['ingredient__name'],
+                                   ingredient['amount'],
+                                   ingredient['ingredient__measurement_unit']))
+
+
+def cyrillic_glyph_names():
+    """Имена глифов Adobe для кириллицы в кодировке cp1251."""
+    names = [(0xA8, 'afii10023'), (0xB8, 'afii10071')]
+    for offset, first_glyph in ((0xC0, 10017), (0xE0, 10065)):
+        for index in range(32):
+            glyph = first_glyph + index + (index >= 6)
+            names.append((offset + index, f'afii{glyph}'))
+    return names
+
+
+class PdfWriter:
+    """Пишет PDF по частям, запоминая смещения объектов для xref."""
+
+    def __init__(self):
+        self.offsets = {}
+        self.position = 0
+
+    def chunk(self, data):
+        self.position += len(data)
+        return data
+
+    def object(self, number, body):
+        self.offsets[number] = self.position
+        return self.chunk(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def stream_object(self, number, content):
+        return self.object(
+            number,
+            b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content),
+                                                          content))
+
+    def trailer(self, root):
+        xref = self.position
+        size = max(self.offsets) + 1
+        entries = b''.join(b'%010d 00000 n \n' % self.offsets[number]
+                           for number in range(1, size))
+        return self.chunk(
+            b'xref\n0 %d\n0000000000 65535 f \n%s'
+            b'trailer\n<< /Size %d /Root %d 0 R >>\n'
+            b'startxref\n%d\n%%%%EOF\n' % (size, entries, size, root, xref))
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в PDF.
+
+    Страницы пишутся в поток по мере заполнения, в памяти держится
+    только текущая страница. Используется стандартный шрифт Helvetica
+    с кириллической кодировкой cp1251 и именами глифов Adobe, шрифт не
+    встраивается: кириллицу рисует шрифт, которым просмотрщик заменяет
+    Helvetica, а текст извлекается по именам глифов.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    page_width = 595
+    page_height = 842
+    margin = 56
+    font_size = 12
+    leading = 18
+    catalog, pages, font = 1, 2, 3
+
+    @property
+    def lines_per_page(self):
+        return (self.page_height - 2 * self.margin) // self.leading
+
+    @staticmethod
+    def encode(line):
+        return (line.encode('cp1251', errors='replace')
+                .replace(b'\\', b'\\\\')
+                .replace(b'(', b'\\(')
+                .replace(b')', b'\\)'))
+
+    def font_object(self):
+        differences = ' '.join(f'{code} /{name}'
+                               for code, name in cyrillic_glyph_names())
+        return (
+            '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+            '/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+            f'/Differences [{differences}] >> >>'
+        ).encode('ascii')
+
+    def page_content(self, lines):
+        top = self.page_height - self.margin
+        text = b' T* '.join(b'(%s) Tj' % self.encode(line) for line in lines)
+        return b'BT /F1 %d Tf %d TL %d %d Td %s ET' % (
+            self.font_size, self.leading, self.margin, top, text)
+
+    def page_object(self, content):
+        return (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>'
+            % (self.pages, self.page_width, self.page_height,
+               self.font, content))
+
+    def write_page(self, writer, number, lines):
+        yield writer.stream_object(number, self.page_content(lines))
+        yield writer.object(number + 1, self.page_object(number))
+
+    def stream(self, ingredients):
+        writer = PdfWriter()
+        yield writer.chunk(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield writer.object(self.catalog, b'<< /Type /Catalog /Pages %d 0 R >>'
+                            % self.pages)
+        yield writer.object(self.font, self.font_object())
+        kids = []
+        lines = []
+        number = self.font + 1
+        for line in chain((SHOPPING_LIST_TITLE, ''),
+                          map(self.format_line, ingredients)):
+            lines.append(line)
+            if len(lines) == self.lines_per_page:
+                yield from self.write_page(writer, number, lines)
+                kids.append(number + 1)
+                number += 2
+                lines = []
+        if lines:
+            yield from self.write_page(writer, number, lines)
+            kids.append(number + 1)
+        yield writer.object(
+            self.pages,
+            b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)))
+        yield writer.trailer(self.catalog)
@@ -1,8 +1,14 @@
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Value
 from rest_framework.serializers import ValidationError
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import status
 
+from recipes import counters, shopping_list
+from recipes.images import variant_ready
 from recipes.models import (Ingredient,
                             Recipe,
                             Tag,
@@ -10,7 +16,24 @@ from recipes.models import (Ingredient,
                             Favorites,
                             ShoppingCart)
 from users.models import User, Follow
-from foodgram.constants import MAX_AMOUNT, MIN_AMOUNT, COOKING_TIME
+from foodgram.constants import (BULK_MAX_SIZE,
+                                COOKING_TIME,
+                                MAX_AMOUNT,
+                                MIN_AMOUNT)
+
+
+@contextmanager
+def reject_conflicts(detail):
+    """Транзакция, в которой нарушение ограничения даёт ошибку 400.
+
+    Вставка идёт без предварительной проверки exists(), поэтому повторный
+    или параллельный запрос упирается в уникальное ограничение.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError:
+        raise ValidationError(detail, code=status.HTTP_400_BAD_REQUEST)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -28,10 +51,20 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        return request and (
-            request.user.is_authenticated
-            and request.user.follower.filter(recipe_author=obj).exists()
-        )
+        if not (request and request.user.is_authenticated
+                and request.user.id != obj.id):
+            return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in self.get_subscriptions(request.user)
+
+    def get_subscriptions(self, user):
+        subscriptions = self.context.get('subscriptions')
+        if subscriptions is None:
+            subscriptions = set(user.follower.values_list(
+                'recipe_author_id', flat=True))
+            self.context['subscriptions'] = subscriptions
+        return subscriptions
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -47,7 +80,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class IngredientAmountSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(min_value=1)
     amount = serializers.IntegerField(max_value=MAX_AMOUNT,
                                       min_value=MIN_AMOUNT)
 
@@ -69,9 +102,8 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientAmountSerializer(many=True, required=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True,
-                                              required=True)
+    tags = serializers.ListField(child=serializers.IntegerField(min_value=1),
+                                 required=True)
     image = Base64ImageField(required=True,
                              allow_null=False,
                              allow_empty_file=False,
@@ -107,8 +139,24 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 {'ingredients': 'Нельзя использовать два ингрдиента.'}
             )
+        found_tags = self.in_bulk(Tag, tags, 'tags', 'Теги не найдены: {}.')
+        found_ingredients = self.in_bulk(
+            Ingredient, ingredients_ids, 'ingredients',
+            'Ингредиенты не найдены: {}.')
+        data['tags'] = [found_tags[pk] for pk in tags]
+        for ingredient in ingredients:
+            ingredient['id'] = found_ingredients[ingredient['id']]
         return data
 
+    @staticmethod
+    def in_bulk(model, ids, field, message):
+        """Загружает объекты одним запросом и сообщает обо всех ненайденных."""
+        found = model.objects.in_bulk(ids)
+        missing = [str(pk) for pk in ids if pk not in found]
+        if missing:
+            raise ValidationError({field: message.format(', '.join(missing))})
+        return found
+
     @staticmethod
     def create_ingredients(recipe, ingredients_data):
         recipe_ingredients = [
@@ -121,28 +169,80 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ]
         IngredientAmount.objects.bulk_create(recipe_ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
         recipe = Recipe.objects.create(author=self.context['request'].user,
                                        **validated_data)
+        counters.change(User, recipe.author_id, 'recipes_count', 1)
         recipe.tags.set(tags_data)
         self.create_ingredients(recipe, ingredients_data)
         return recipe
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients_data):
+        """Приводит ингредиенты рецепта к новому списку минимумом записей.
+
+        Текущий состав читается заново под блокировкой рецепта, а не из
+        предзагрузки ViewSet: параллельная правка того же рецепта ждёт
+        конца транзакции. Возвращает изменения количеств по ингредиентам.
+        """
+        Recipe.objects.select_for_update().only('pk').get(pk=recipe.pk)
+        current = {amount.ingredient_id: amount for amount
+                   in IngredientAmount.objects.filter(recipe=recipe)}
+        submitted = {ingredient['id'].id: ingredient
+                     for ingredient in ingredients_data}
+        created, changed = [], []
+        deltas = {}
+        for ingredient_id, ingredient in submitted.items():
+            amount = current.get(ingredient_id)
+            if amount is None:
+                created.append(IngredientAmount(
+                    recipe=recipe, ingredient=ingredient['id'],
+                    amount=ingredient['amount']))
+                deltas[ingredient_id] = ingredient['amount']
+            elif amount.amount != ingredient['amount']:
+                deltas[ingredient_id] = ingredient['amount'] - amount.amount
+                amount.amount = ingredient['amount']
+                changed.append(amount)
+        removed = [amount for ingredient_id, amount in current.items()
+                   if ingredient_id not in submitted]
+        for amount in removed:
+            deltas[amount.ingredient_id] = -amount.amount
+        IngredientAmount.objects.bulk_create(created)
+        IngredientAmount.objects.bulk_update(changed, ('amount',))
+        if removed:
+            IngredientAmount.objects.filter(
+                pk__in=[amount.pk for amount in removed]).delete()
+        return deltas
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients')
-        instance.ingredients.clear()
-        self.create_ingredients(instance, ingredients_data)
+        shopping_list.change_recipe(
+            instance.pk, self.update_ingredients(instance, ingredients_data))
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         return RecipeSerializer(instance, context=self.context).data
 
 
+class ImageVariantField(serializers.ImageField):
+    def __init__(self, **kwargs):
+        super().__init__(read_only=True, **kwargs)
+
+    def get_attribute(self, instance):
+        if variant_ready(instance, self.source):
+            return getattr(instance, self.source)
+        return instance.image
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     image = Base64ImageField()
+    image_small = ImageVariantField()
+    image_medium = ImageVariantField()
     author = UserSerializer(read_only=True)
     ingredients = IngredientRecipeSerializer(many=True,
                                              source='ingredientamount_set')
@@ -151,36 +251,41 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'tags', 'image', 'author', 'ingredients',
-                  'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time')
+        fields = ('id', 'tags', 'image', 'image_small', 'image_medium',
+                  'author', 'ingredients', 'is_favorited',
+                  'is_in_shopping_cart', 'name', 'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
-        return (
-            request and request.user.is_authenticated
-            and request.user.favorites.filter(recipe=obj).exists()
-        )
+        if not (request and request.user.is_authenticated):
+            return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return request.user.favorites.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
-        return (
-            request and request.user.is_authenticated
-            and request.user.shopping_cart.filter(recipe=obj).exists()
-        )
+        if not (request and request.user.is_authenticated):
+            return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return request.user.shopping_cart.filter(recipe=obj).exists()
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_small = ImageVariantField()
+    image_medium = ImageVariantField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_small', 'image_medium',
+                  'cooking_time')
 
 
 class FollowShowSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         model = User
@@ -188,64 +293,85 @@ class FollowShowSerializer(UserSerializer):
             'recipes', 'recipes_count'
         )
 
-    def get_recipes(self, obj):
-        recipes_limit = self.context['request'].query_params.get(
-            'recipes_limit'
-        )
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            try:
-                recipes_limit = int(recipes_limit)
-            except (ValueError, TypeError):
-                recipes_limit = None
+    @staticmethod
+    def get_recipes_limit(request):
+        try:
+            recipes_limit = int(request.query_params.get('recipes_limit'))
+        except (ValueError, TypeError):
+            return None
+        return recipes_limit if recipes_limit >= 0 else None
+
+    @classmethod
+    def setup_queryset(cls, queryset, request):
+        recipes = Recipe.objects.all()
+        recipes_limit = cls.get_recipes_limit(request)
+        if recipes_limit is not None:
             recipes = recipes[:recipes_limit]
+        return queryset.annotate(
+            is_subscribed=Value(True),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recipes_preview'))
+
+    def get_recipes(self, obj):
+        recipes = getattr(obj, 'recipes_preview', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            recipes_limit = self.get_recipes_limit(self.context['request'])
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         return RecipeShortSerializer(recipes,
                                      many=True,
                                      context=self.context).data
 
 
 class FollowSerializer(serializers.ModelSerializer):
+    follower = serializers.HiddenField(
+        default=serializers.CurrentUserDefault())
 
     class Meta:
         model = Follow
         fields = ('follower', 'recipe_author')
 
     def validate(self, data):
-        recipe_author = data.get('recipe_author')
-        follower = data.get('follower')
-        if recipe_author == follower:
-            raise ValidationError(
-                detail='Подписка уже есть.',
-                code=status.HTTP_400_BAD_REQUEST)
-
-        if recipe_author == follower:
+        if data['recipe_author'] == data['follower']:
             raise ValidationError(
                 detail='Нельзя подписаться на самого себя.',
                 code=status.HTTP_400_BAD_REQUEST)
         return data
 
+    def create(self, validated_data):
+        with reject_conflicts('Подписка уже есть.'):
+            follow = super().create(validated_data)
+            counters.change(User, follow.recipe_author_id,
+                            'followers_count', 1)
+        return follow
+
     def to_representation(self, instance):
+        recipe_author = FollowShowSerializer.setup_queryset(
+            User.objects.all(), self.context['request']
+        ).get(pk=instance.recipe_author_id)
         return FollowShowSerializer(
-            instance.recipe_author,
+            recipe_author,
             context=self.context).data
 
 
 class FavoriteAndShoppingCartSerializer(serializers.ModelSerializer):
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
         model = None
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        user = data.get('user')
-        recipe_id = data.get('recipe').id
-        if self.Meta.model.objects.filter(user=user,
-                                          recipe_id=recipe_id).exists():
-            raise serializers.ValidationError(
-                {'detail': f'Рецепт уже добавлен в '
-                 f'{self.Meta.model._meta.verbose_name}!'}
-            )
-        return data
+    def create(self, validated_data):
+        with reject_conflicts({'detail': f'Рецепт уже добавлен в '
+                               f'{self.Meta.model._meta.verbose_name}!'}):
+            instance = super().create(validated_data)
+            self.after_create(instance)
+        return instance
+
+    def after_create(self, instance):
+        counters.change(Recipe, instance.recipe_id,
+                        counters.RECIPE_COUNTERS[self.Meta.model], 1)
 
     def to_representation(self, instance):
         serializer = RecipeShortSerializer(
@@ -257,8 +383,22 @@ class ShoppingCartSerializer(FavoriteAndShoppingCartSerializer):
     class Meta(FavoriteAndShoppingCartSerializer.Meta):
         model = ShoppingCart
 
+    def after_create(self, instance):
+        super().after_create(instance)
+        shopping_list.add_recipes(instance.user_id, [instance.recipe_id])
+
 
 class FavoriteSerializer(FavoriteAndShoppingCartSerializer):
     class Meta(FavoriteAndShoppingCartSerializer.Meta):
         model = Favorites
         fields = ('recipe', 'user')
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_MAX_SIZE)
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
@@ -0,0 +1,206 @@
+"""Журнал медленных SQL-запросов с планами выполнения.
+
+Включается настройкой SLOW_QUERY_THRESHOLD_MS. Каждый запрос дольше
+порога записывается строкой JSON в SLOW_QUERY_LOG вместе с view и
+отпечатком — текстом запроса без значений. Для части запросов SELECT
+дополнительно снимается план: EXPLAIN (ANALYZE, BUFFERS) на PostgreSQL и
+EXPLAIN QUERY PLAN на SQLite. План одного отпечатка снимается не чаще
+раза в SLOW_QUERY_EXPLAIN_INTERVAL секунд и с вероятностью
+SLOW_QUERY_EXPLAIN_RATE, чтобы повторное выполнение запроса не
+нагружало базу. Команда slow_queries сортирует отпечатки по общему
+времени.
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+from time import monotonic, perf_counter
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from api.metrics import UNRESOLVED, view_name
+
+logger = logging.getLogger(__name__)
+
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+_lock = threading.Lock()
+_explained_at = {}
+
+
+def fingerprint(sql):
+    """Текст запроса без значений и его короткий хеш."""
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    sql = sql.strip()
+    return hashlib.md5(sql.encode()).hexdigest()[:12], sql
+
+
+def should_explain(key):
+    now = monotonic()
+    with _lock:
+        last = _explained_at.get(key)
+        if (last is not None
+                and now - last < settings.SLOW_QUERY_EXPLAIN_INTERVAL):
+            return False
+        if random.random() >= settings.SLOW_QUERY_EXPLAIN_RATE:
+            return False
+        _explained_at[key] = now
+    return True
+
+
+def explain(connection, sql, params):
+    if connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        return None
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                rows = cursor.fetchall()
+    except DatabaseError:
+        logger.warning('Не удалось получить план запроса.', exc_info=True)
+        return None
+    if connection.vendor == 'sqlite':
+        return '\n'.join(row[-1] for row in rows)
+    return '\n'.join(row[0] for row in rows)
+
+
+def write_record(record):
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    try:
+        with _lock, open(settings.SLOW_QUERY_LOG, 'a',
+                         encoding='utf-8') as file:
+            file.write(line)
+    except OSError:
+        logger.warning('Не удалось записать медленный запрос.', exc_info=True)
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms):
+        self.threshold = threshold_ms / 1000
+        self.view = UNRESOLVED
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = perf_counter()
+        result = execute(sql, params, many, context)
+        duration = perf_counter() - started
+        if duration >= self.threshold:
+            self.record(context['connection'], sql, params, many, duration)
+        return result
+
+    def record(self, connection, sql, params, many, duration):
+        key, normalized = fingerprint(sql)
+        plan = None
+        if (not many and sql.lstrip()[:6].upper() == 'SELECT'
+                and should_explain(key)):
+            self.explaining = True
+            try:
+                plan = explain(connection, sql, params)
+            finally:
+                self.explaining = False
+        write_record({
+            'time': timezone.now().isoformat(),
+            'fingerprint': key,
+            'sql': normalized,
+            'duration_ms': round(duration * 1000, 3),
+            'view': self.view,
+            'vendor': connection.vendor,
+            'plan': plan,
+        })
+
+
+class SlowQueryMiddleware:
+    """Включает журнал медленных запросов на время обработки запроса.
+
+    Под ASGI журнал подключается к соединениям потока, в котором
+    sync_to_async выполняет запросы к базе.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if not threshold:
+            return self.get_response(request)
+        request.slow_query_log = log = SlowQueryLog(threshold)
+        databases = self.attach(log)
+        return self.detach_when_done(self.get_response(request), log,
+                                     databases)
+
+    async def __acall__(self, request):
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if not threshold:
+            return await self.get_response(request)
+        request.slow_query_log = log = SlowQueryLog(threshold)
+        databases = await sync_to_async(self.attach)(log)
+        return self.detach_when_done(await self.get_response(request), log,
+                                     databases)
+
+    @staticmethod
+    def attach(log):
+        databases = connections.all()
+        for connection in databases:
+            connection.execute_wrappers.append(log)
+        return databases
+
+    @staticmethod
+    def detach(log, databases):
+        for connection in databases:
+            if log in connection.execute_wrappers:
+                connection.execute_wrappers.remove(log)
+
+    def detach_when_done(self, response, log, databases):
+        if not response.streaming:
+            self.detach(log, databases)
+        elif response.is_async:
+            response.streaming_content = self.adetach_after(
+                response.streaming_content, log, databases)
+        else:
+            response.streaming_content = self.detach_after(
+                response.streaming_content, log, databases)
+        return response
+
+    def detach_after(self, content, log, databases):
+        try:
+            yield from content
+        finally:
+            self.detach(log, databases)
+
+    async def adetach_after(self, content, log, databases):
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            self.detach(log, databases)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        log = getattr(request, 'slow_query_log', None)
+        if log is not None:
+            log.view = view_name(request, view_func)
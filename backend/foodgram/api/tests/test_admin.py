@@ -0,0 +1,70 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipes.models import (Favorites, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+
+class AdminChangelistQueriesTest(TestCase):
+    CHANGELISTS = ('admin:recipes_recipe_changelist',
+                   'admin:recipes_ingredient_changelist',
+                   'admin:recipes_favorites_changelist',
+                   'admin:recipes_shoppingcart_changelist',
+                   'admin:users_user_changelist',
+                   'admin:users_follow_changelist')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.tag = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                     slug='breakfast')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, start, count):
+        users = User.objects.bulk_create(
+            User(username=f'user{i}', email=f'user{i}@example.com')
+            for i in range(start, start + count))
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit=f'ед{i}')
+            for i in range(start, start + count))
+        for user, ingredient in zip(users, ingredients):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {user.username}', text='Описание',
+                cooking_time=5, author=user, image='recipes/image.png')
+            recipe.tags.set((self.tag,))
+            IngredientAmount.objects.create(recipe=recipe,
+                                            ingredient=ingredient, amount=1)
+            Favorites.objects.create(user=self.admin, recipe=recipe)
+            ShoppingCart.objects.create(user=self.admin, recipe=recipe)
+            Follow.objects.create(follower=self.admin, recipe_author=user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_rows(self):
+        self.add_rows(0, 2)
+        budgets = {name: self.count_queries(reverse(name))
+                   for name in self.CHANGELISTS}
+        self.add_rows(2, 20)
+        for name in self.CHANGELISTS:
+            with self.subTest(changelist=name):
+                with self.assertNumQueries(budgets[name]):
+                    self.client.get(reverse(name))
+
+    def test_recipe_change_form(self):
+        self.add_rows(0, 20)
+        recipe = Recipe.objects.get(author__username='user0')
+        response = self.client.get(
+            reverse('admin:recipes_recipe_change', args=(recipe.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Ингредиент 19</option>')
+        self.assertNotContains(response, 'user19</option>')
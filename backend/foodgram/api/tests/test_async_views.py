@@ -0,0 +1,169 @@
+import json
+import os
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api import async_views, urls
+from recipes.models import (Favorites, Ingredient, IngredientAmount, Recipe,
+                            Tag)
+from users.models import Follow, User
+from .utils import LOCMEM_CACHES
+
+urlpatterns = [
+    path('api/', include((async_views.urlpatterns + urls.urlpatterns,
+                          'api'))),
+]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncReadViewsTest(APITestCase):
+    """Асинхронные view отвечают так же, как синхронные ViewSet."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.token = Token.objects.create(user=cls.reader)
+        breakfast = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                       slug='breakfast')
+        dinner = Tag.objects.create(name='Ужин', color='#49B64E',
+                                    slug='dinner')
+        milk = Ingredient.objects.create(name='молоко',
+                                         measurement_unit='мл')
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        cls.recipes = []
+        for number in range(8):
+            recipe = Recipe.objects.create(
+                name=f'Блины {number}', text='Описание', cooking_time=10,
+                author=cls.author if number % 2 else cls.reader,
+                image='recipes/image.png')
+            recipe.tags.set([breakfast] if number % 3 else [dinner])
+            IngredientAmount.objects.bulk_create([
+                IngredientAmount(recipe=recipe, ingredient=milk, amount=200),
+                IngredientAmount(recipe=recipe, ingredient=flour, amount=100),
+            ])
+            cls.recipes.append(recipe)
+        Favorites.objects.create(user=cls.reader, recipe=cls.recipes[1])
+        Follow.objects.create(follower=cls.reader, recipe_author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    async def async_get(self, url, token=None, headers=None):
+        headers = dict(headers or {})
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        with override_settings(ROOT_URLCONF=__name__):
+            return await self.async_client.get(url, headers=headers)
+
+    def sync_get(self, url, token=None, headers=None):
+        self.client.credentials(
+            **({'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}))
+        return self.client.get(url, headers=headers)
+
+    async def assertSameResponse(self, url, token=None):
+        expected = await sync_to_async(self.sync_get)(url, token)
+        response = await self.async_get(url, token)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    async def test_catalogs(self):
+        for url in ('/api/tags/', '/api/tags/1/', '/api/tags/999/',
+                    '/api/ingredients/', '/api/ingredients/?name=МО',
+                    '/api/ingredients/1/', '/api/ingredients/999/'):
+            with self.subTest(url=url):
+                await self.assertSameResponse(url)
+
+    async def test_tags_not_modified(self):
+        response = await self.async_get('/api/tags/')
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.get(
+                '/api/tags/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_recipe_list(self):
+        for url in ('/api/recipes/', '/api/recipes/?page=2',
+                    '/api/recipes/?limit=3&ordering=name',
+                    f'/api/recipes/?author={self.author.id}',
+                    '/api/recipes/?tags=dinner&is_favorited=1',
+                    '/api/recipes/?is_favorited=1',
+                    '/api/recipes/?author=999', '/api/recipes/?page=9'):
+            for token in (None, self.token.key):
+                with self.subTest(url=url, token=token):
+                    await self.assertSameResponse(url, token)
+
+    async def test_recipe_detail(self):
+        for pk in (self.recipes[0].id, self.recipes[1].id, 999):
+            for token in (None, self.token.key):
+                with self.subTest(pk=pk, token=token):
+                    await self.assertSameResponse(f'/api/recipes/{pk}/',
+                                                  token)
+
+    async def test_content_negotiation(self):
+        recipe_url = f'/api/recipes/{self.recipes[1].id}/'
+        for url, accept in (('/api/recipes/', 'text/html'),
+                            (recipe_url, 'text/html'),
+                            ('/api/tags/', 'text/html'),
+                            ('/api/ingredients/999/', 'text/html'),
+                            ('/api/recipes/?format=json', 'text/html'),
+                            (recipe_url + '?format=json', None),
+                            ('/api/tags/?format=api', None),
+                            ('/api/recipes/', 'application/xml'),
+                            ('/api/recipes/?format=xml', None)):
+            for token in (None, self.token.key):
+                with self.subTest(url=url, accept=accept, token=token):
+                    headers = {'Accept': accept} if accept else {}
+                    expected = await sync_to_async(self.sync_get)(
+                        url, token, headers)
+                    response = await self.async_get(url, token, headers)
+                    self.assertEqual(response.status_code,
+                                     expected.status_code)
+                    self.assertEqual(response['Content-Type'],
+                                     expected['Content-Type'])
+                    self.assertEqual(response['Vary'], expected['Vary'])
+                    if expected['Content-Type'] == 'application/json':
+                        self.assertEqual(response.json(), expected.json())
+                    elif expected.status_code == 200:
+                        self.assertIn('Django REST framework',
+                                      response.content.decode())
+
+    async def test_invalid_token(self):
+        response = await self.assertSameResponse('/api/recipes/', 'wrong')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+    async def test_cursor_and_writes_use_viewset(self):
+        response = await self.assertSameResponse('/api/recipes/?cursor=')
+        self.assertNotIn('count', response.json())
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.post('/api/recipes/', {})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_metrics_count_async_queries(self):
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.get('/api/recipes/')
+            self.assertIs(response.resolver_match.func,
+                          async_views.recipe_list)
+        self.assertRegex(response['Server-Timing'],
+                         r'desc="([1-9]\d*) queries"')
+
+    async def test_slow_queries_logged(self):
+        file, path = tempfile.mkstemp()
+        os.close(file)
+        self.addCleanup(os.remove, path)
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6,
+                               SLOW_QUERY_EXPLAIN_RATE=0,
+                               SLOW_QUERY_LOG=path):
+            await self.async_get('/api/recipes/', self.token.key)
+        with open(path, encoding='utf-8') as log:
+            views = {json.loads(line)['view'] for line in log}
+        self.assertEqual(views, {'RecipeViewSet.list'})
@@ -0,0 +1,110 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes import shopping_list
+from recipes.models import (Favorites, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart)
+from users.models import Follow, User
+
+
+class BulkEndpointsTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.authors = User.objects.bulk_create(
+            User(username=f'author{i}', email=f'author{i}@example.com')
+            for i in range(3))
+        cls.ingredient = Ingredient.objects.create(name='соль',
+                                                   measurement_unit='г')
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(name=f'Рецепт {i}', text='Описание', cooking_time=5,
+                   author=cls.authors[0], image='recipes/image.png')
+            for i in range(3))
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=cls.ingredient,
+                             amount=i + 1)
+            for i, recipe in enumerate(cls.recipes))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def cart_writes(queries):
+        return [query['sql'].split()[0] for query in queries
+                if 'recipes_shoppingcart' in query['sql']
+                and not query['sql'].startswith('SELECT')]
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item['status']
+                for item in response.data['results']}
+
+    def test_shopping_cart(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        ShoppingCart.objects.create(user=self.user, recipe_id=first)
+        shopping_list.add_recipes(self.user.id, [first])
+        url = reverse('api:recipes-shopping-cart-bulk')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                url, {'ids': [first, second, third, second, 999]},
+                format='json')
+        self.assertEqual(self.cart_writes(queries), ['INSERT'])
+        self.assertEqual(self.statuses(response), {
+            first: 'exists', second: 'created', third: 'created',
+            999: 'not_found'})
+        self.assertEqual(
+            list(self.user.shopping_list.values_list('amount', flat=True)),
+            [6])
+        self.assertEqual(
+            list(Recipe.objects.order_by('pk')
+                 .values_list('in_carts_count', flat=True)), [0, 1, 1])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(url, {'ids': [first, third]},
+                                          format='json')
+        self.assertEqual(self.cart_writes(queries), ['DELETE'])
+        self.assertEqual(self.statuses(response),
+                         {first: 'deleted', third: 'deleted'})
+        response = self.client.delete(url, {'ids': [first]}, format='json')
+        self.assertEqual(self.statuses(response), {first: 'absent'})
+        self.assertEqual(
+            list(self.user.shopping_cart.values_list('recipe_id', flat=True)),
+            [second])
+        self.assertEqual(
+            list(self.user.shopping_list.values_list('amount', flat=True)),
+            [2])
+
+    def test_favorites(self):
+        url = reverse('api:recipes-favorite-bulk')
+        ids = [recipe.id for recipe in self.recipes]
+        response = self.client.post(url, {'ids': ids}, format='json')
+        self.assertEqual(set(self.statuses(response).values()), {'created'})
+        self.assertEqual(Favorites.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            set(Recipe.objects.values_list('favorites_count', flat=True)),
+            {1})
+
+    def test_subscriptions(self):
+        url = reverse('api:users-subscriptions-bulk')
+        ids = [author.id for author in self.authors]
+        response = self.client.post(url, {'ids': ids + [self.user.id]},
+                                    format='json')
+        self.assertEqual(self.statuses(response)[self.user.id], 'invalid')
+        self.assertEqual(Follow.objects.filter(follower=self.user).count(), 3)
+        response = self.client.delete(url, {'ids': ids[:2]}, format='json')
+        self.assertEqual(set(self.statuses(response).values()), {'deleted'})
+        self.assertEqual(
+            list(User.objects.filter(pk__in=ids).order_by('pk')
+                 .values_list('followers_count', flat=True)), [0, 0, 1])
+
+    def test_validation(self):
+        url = reverse('api:recipes-favorite-bulk')
+        for data in ({}, {'ids': []}, {'ids': ['x']}, {'ids': [1] * 101}):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(None)
+        response = self.client.post(url, {'ids': [1]}, format='json')
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,97 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.models import Favorites, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follow, User
+from .utils import IMAGE, TempMediaMixin
+
+
+class CountersTest(TempMediaMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.tag = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                     slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(name='соль',
+                                                   measurement_unit='г')
+
+    def create_recipe(self, name):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(reverse('api:recipes-list'), {
+            'name': name, 'text': 'Описание', 'cooking_time': 5,
+            'image': IMAGE, 'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Recipe.objects.get(pk=response.data['id'])
+
+    def test_api_paths_update_counters(self):
+        recipe = self.create_recipe('Каша')
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        self.client.force_authenticate(self.reader)
+        for name in ('favorite', 'shopping-cart'):
+            self.client.post(reverse(f'api:recipes-{name}',
+                                     args=(recipe.id,)))
+        self.client.post(reverse('api:users-subscribe',
+                                 args=(self.author.id,)))
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((recipe.favorites_count, recipe.in_carts_count),
+                         (1, 1))
+        self.assertEqual(self.author.followers_count, 1)
+        for name in ('favorite', 'shopping-cart'):
+            self.client.delete(reverse(f'api:recipes-{name}',
+                                       args=(recipe.id,)))
+        self.client.delete(reverse('api:users-subscribe',
+                                   args=(self.author.id,)))
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((recipe.favorites_count, recipe.in_carts_count),
+                         (0, 0))
+        self.assertEqual(self.author.followers_count, 0)
+        self.client.force_authenticate(self.author)
+        self.client.delete(reverse('api:recipes-detail', args=(recipe.id,)))
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_ordering(self):
+        recipes = [self.create_recipe(name) for name in ('А', 'Б', 'В')]
+        Recipe.objects.filter(pk=recipes[1].pk).update(favorites_count=5)
+        Recipe.objects.filter(pk=recipes[2].pk).update(favorites_count=2)
+        response = self.client.get(reverse('api:recipes-list'),
+                                   {'ordering': '-favorites_count'})
+        self.assertEqual([recipe['name'] for recipe in
+                          response.data['results']], ['Б', 'В', 'А'])
+        User.objects.filter(pk=self.reader.pk).update(followers_count=3)
+        response = self.client.get(reverse('api:users-list'),
+                                   {'ordering': '-followers_count'})
+        self.assertEqual(response.data['results'][0]['id'], self.reader.id)
+
+    def test_reconcile_counters(self):
+        recipe = Recipe.objects.create(
+            name='Каша', text='Описание', cooking_time=5,
+            author=self.author, image='recipes/image.png')
+        Favorites.objects.create(user=self.reader, recipe=recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+        Follow.objects.create(follower=self.reader,
+                              recipe_author=self.author)
+        User.objects.filter(pk=self.reader.pk).update(recipes_count=7)
+        out = StringIO()
+        call_command('reconcile_counters', chunk_size=1, stdout=out)
+        self.assertIn('исправлено 1', out.getvalue())
+        self.assertIn('исправлено 2', out.getvalue())
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.favorites_count, recipe.in_carts_count),
+                         (1, 1))
+        self.assertEqual(
+            list(User.objects.order_by('username')
+                 .values_list('recipes_count', 'followers_count')),
+            [(1, 1), (0, 0)])
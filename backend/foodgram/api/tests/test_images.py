@@ -0,0 +1,75 @@
+import base64
+from io import BytesIO
+from unittest import mock
+
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from recipes.images import generate_variants, run_in_background
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+from .utils import TempMediaMixin
+
+
+def make_image(width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), '#E26C2D').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class ImageVariantsTest(TempMediaMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.tag = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                     slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(name='соль',
+                                                   measurement_unit='г')
+
+    def setUp(self):
+        self.client.force_authenticate(self.author)
+
+    def create_recipe(self):
+        with mock.patch('recipes.images.executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('api:recipes-list'),
+                    {'name': 'Каша', 'text': 'Описание', 'cooking_time': 5,
+                     'tags': [self.tag.id],
+                     'ingredients': [{'id': self.ingredient.id,
+                                      'amount': 1}],
+                     'image': make_image(1200, 600)},
+                    format='json')
+        self.assertEqual(response.status_code, 201)
+        executor.submit.assert_called_once_with(run_in_background,
+                                                response.data['id'])
+        return response.data
+
+    def test_original_until_variants_exist(self):
+        data = self.create_recipe()
+        self.assertEqual(data['image_small'], data['image'])
+        self.assertEqual(data['image_medium'], data['image'])
+        generate_variants(data['id'])
+        data = self.client.get(
+            reverse('api:recipes-detail', args=(data['id'],))).data
+        self.assertTrue(data['image_small'].endswith('.webp'))
+        recipe = Recipe.objects.get(pk=data['id'])
+        with Image.open(recipe.image_small) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 160)))
+        with Image.open(recipe.image_medium) as image:
+            self.assertEqual(image.size, (800, 400))
+
+    def test_new_image_invalidates_variants(self):
+        data = self.create_recipe()
+        generate_variants(data['id'])
+        recipe = Recipe.objects.get(pk=data['id'])
+        recipe.image = 'recipes/other.png'
+        recipe.save()
+        data = self.client.get(
+            reverse('api:recipes-detail', args=(recipe.id,))).data
+        self.assertEqual(data['image_small'], data['image'])
+        self.assertEqual(data['image_medium'], data['image'])
@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from api.management.commands.check_indexes import full_scans
+
+
+class FullScansTest(SimpleTestCase):
+
+    def test_sqlite_plan(self):
+        plan = ('SCAN recipes_recipe USING INDEX recipe_feed_idx\n'
+                'SCAN users_follow\n'
+                'SEARCH U0 USING COVERING INDEX favorites (user_id=?)\n'
+                'SCAN U1 AS T2')
+        self.assertEqual(full_scans(plan, 'sqlite'), ['users_follow', 'U1'])
+
+    def test_postgresql_plan(self):
+        plan = ('Limit  (cost=0.28..1.02 rows=6 width=8)\n'
+                '  ->  Index Scan using recipe_feed_idx on recipes_recipe\n'
+                '  ->  Seq Scan on users_follow  (cost=0.00..1.01 rows=1)')
+        self.assertEqual(full_scans(plan, 'postgresql'), ['users_follow'])
+
+
+class CheckIndexesTest(TestCase):
+
+    def test_canonical_queries_use_indexes(self):
+        out = StringIO()
+        call_command('check_indexes', stdout=out)
+        self.assertNotIn('без индекса', out.getvalue())
+
+    def test_missing_raw_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX ingredient_name_prefix_idx')
+        out = StringIO()
+        with self.assertRaisesMessage(
+                CommandError,
+                'Нет индексов: recipes_ingredient.ingredient_name_prefix_idx'):
+            call_command('check_indexes', stdout=out)
+        self.assertIn('Нет индекса: recipes_ingredient.'
+                      'ingredient_name_prefix_idx', out.getvalue())
@@ -0,0 +1,57 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from foodgram.constants import INGREDIENTS_SEARCH_LIMIT
+from recipes.caches import ingredient_index
+from recipes.management.commands.benchmark_ingredient_search import Command
+from recipes.models import Ingredient
+
+
+class IngredientSearchTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Сахар {i:03}', measurement_unit='г')
+            for i in range(INGREDIENTS_SEARCH_LIMIT + 10)
+        )
+        Ingredient.objects.create(name='сахарная пудра', measurement_unit='г')
+        cls.salt = Ingredient.objects.create(name='соль',
+                                             measurement_unit='г')
+
+    def setUp(self):
+        ingredient_index.bump()
+
+    def search(self, name):
+        return self.client.get(reverse('api:ingredients-list'),
+                               {'name': name}).data
+
+    def test_prefix_search_without_queries(self):
+        self.search('')
+        with self.assertNumQueries(0):
+            results = self.search('сахарн')
+        self.assertEqual([row['name'] for row in results],
+                         ['сахарная пудра'])
+        with self.assertNumQueries(0):
+            results = self.search('САХ')
+        self.assertEqual(len(results), INGREDIENTS_SEARCH_LIMIT)
+        self.assertEqual(results[0]['name'], 'Сахар 000')
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.search('перец'), [])
+        Ingredient.objects.create(name='перец', measurement_unit='г')
+        self.assertEqual(len(self.search('перец')), 1)
+        self.salt.delete()
+        self.assertEqual(self.search('соль'), [])
+
+    def test_retrieve(self):
+        response = self.client.get(
+            reverse('api:ingredients-detail', args=(self.salt.id,)))
+        self.assertEqual(response.data['name'], 'соль')
+        response = self.client.get(
+            reverse('api:ingredients-detail', args=(0,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_benchmark_compares_same_rows(self):
+        self.assertEqual(Command.search_db('Сахар'),
+                         Command.search_index('Сахар'))
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Ingredient, Tag
+
+
+class LoaderTestMixin:
+
+    def write(self, content, suffix='.csv'):
+        file, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(file, 'w', encoding='utf-8') as data:
+            data.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def load(self, command, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command(command, path=path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+
+class LoadIngredientsTest(LoaderTestMixin, TestCase):
+    CSV = ('молоко,мл\nмука,г\nсоль,г\nсахар,г\nмука,кг\n')
+
+    def test_batches(self):
+        path = self.write(self.CSV)
+        with CaptureQueriesContext(connection) as queries:
+            out, _ = self.load('load_ingredients', path, batch_size=2)
+        inserts = [query for query in queries
+                   if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+        self.assertIn('Заполнение завершено: 5 строк', out)
+        self.assertEqual(Ingredient.objects.count(), 5)
+
+    def test_rerun_is_idempotent(self):
+        path = self.write(self.CSV)
+        self.load('load_ingredients', path)
+        self.load('load_ingredients', path, batch_size=2)
+        self.assertEqual(Ingredient.objects.count(), 5)
+
+    def test_json(self):
+        path = self.write(json.dumps([
+            {'name': 'молоко', 'measurement_unit': 'мл'},
+            {'name': 'мука', 'measurement_unit': 'г'},
+        ]), suffix='.json')
+        self.load('load_ingredients', path)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_invalid_file(self):
+        for content, suffix in (('молоко\n', '.csv'),
+                                ('[{"name": "молоко"}]', '.json')):
+            with self.subTest(content=content):
+                with self.assertRaises(CommandError):
+                    self.load('load_ingredients',
+                              self.write(content, suffix))
+        with self.assertRaises(CommandError):
+            self.load('load_ingredients', '/nonexistent.csv')
+        with self.assertRaises(CommandError):
+            self.load('load_ingredients', self.write(self.CSV),
+                      batch_size=0)
+        self.assertFalse(Ingredient.objects.exists())
+
+
+class LoadTagsTest(LoaderTestMixin, TestCase):
+    CSV = ('Завтрак,#E00800,breakfast\n'
+           'Обед,#49B64E,lunch\n'
+           'Ужин,#8775D2,dinner\n')
+
+    def test_batches(self):
+        out, err = self.load('load_tags', self.write(self.CSV),
+                             batch_size=2)
+        self.assertIn('Заполнение завершено: 3 строк', out)
+        self.assertEqual(err, '')
+        tags = Tag.objects.all()
+        self.assertEqual({tag.slug for tag in tags},
+                         {'breakfast', 'lunch', 'dinner'})
+        self.assertEqual(len({tag.bit for tag in tags}), 3)
+
+    def test_rerun_updates_by_slug(self):
+        self.load('load_tags', self.write(self.CSV))
+        bits = dict(Tag.objects.values_list('slug', 'bit'))
+        self.load('load_tags', self.write(
+            self.CSV.replace('Обед,#49B64E', 'Ланч,#000000')), batch_size=2)
+        lunch = Tag.objects.get(slug='lunch')
+        self.assertEqual((lunch.name, lunch.color), ('Ланч', '#000000'))
+        self.assertEqual(dict(Tag.objects.values_list('slug', 'bit')), bits)
+
+    def test_conflicts_reported(self):
+        Tag.objects.create(name='Перекус', color='#FFFFFF', slug='snack')
+        _, err = self.load('load_tags', self.write(
+            self.CSV
+            + 'Перекус,#111111,brunch\n'
+            + 'Полдник,#E00800,tea\n'
+            + 'Завтрак 2,#222222,breakfast\n'
+        ), batch_size=2)
+        self.assertIn('Тег brunch пропущен: name Перекус занят тегом snack',
+                      err)
+        self.assertIn('Тег tea пропущен: color #E00800 занят тегом '
+                      'breakfast', err)
+        self.assertIn('Тег breakfast пропущен: slug breakfast повторяется',
+                      err)
+        self.assertIn('Пропущено строк с конфликтами: 3.', err)
+        self.assertEqual(
+            set(Tag.objects.values_list('slug', flat=True)),
+            {'snack', 'breakfast', 'lunch', 'dinner'})
+        self.assertEqual(Tag.objects.get(slug='breakfast').name, 'Завтрак')
@@ -0,0 +1,68 @@
+import re
+
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, IngredientAmount, Recipe, ShoppingCart
+from users.models import User
+
+
+class MetricsTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass')
+        recipe = Recipe.objects.create(
+            name='Блины', text='Описание', cooking_time=10,
+            author=cls.user, image='recipes/image.png')
+        IngredientAmount.objects.create(
+            recipe=recipe, amount=200,
+            ingredient=Ingredient.objects.create(name='мука',
+                                                 measurement_unit='г'))
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def sample(self, metric, view, method='GET', **labels):
+        text = self.client.get(reverse('api:metrics')).content.decode()
+        label_text = ','.join(
+            f'{name}="{value}"' for name, value in sorted(
+                {'view': view, 'method': method, **labels}.items()))
+        match = re.search(
+            rf'^{metric}{{{re.escape(label_text)}}} (\S+)$', text, re.M)
+        return float(match.group(1)) if match else 0.0
+
+    def test_view_metrics(self):
+        before = self.sample('foodgram_request_queries_count',
+                             'RecipeViewSet.list')
+        response = self.client.get(reverse('api:recipes-list'))
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+        self.assertEqual(
+            self.sample('foodgram_request_queries_count',
+                        'RecipeViewSet.list'), before + 1)
+        self.assertGreater(
+            self.sample('foodgram_requests_total', 'RecipeViewSet.list',
+                        status='200'), 0)
+        self.assertGreater(
+            self.sample('foodgram_response_size_bytes_sum',
+                        'RecipeViewSet.list'), 0)
+
+    def test_streaming_response_size(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('api:recipes-download-shopping-cart')
+        before = self.sample('foodgram_response_size_bytes_sum',
+                             'RecipeViewSet.download_shopping_cart')
+        response = self.client.get(url, {'format': 'txt'})
+        size = len(b''.join(response.streaming_content))
+        self.assertEqual(
+            self.sample('foodgram_response_size_bytes_sum',
+                        'RecipeViewSet.download_shopping_cart'),
+            before + size)
+
+    def test_unresolved_path(self):
+        before = self.sample('foodgram_requests_total', 'unresolved',
+                             status='404')
+        self.client.get('/api/missing/')
+        self.assertEqual(self.sample('foodgram_requests_total', 'unresolved',
+                                     status='404'), before + 1)
@@ -0,0 +1,128 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.paginations import CachedCountPaginator
+from foodgram.constants import MAX_PAGE_SIZE
+from recipes.caches import tag_catalog
+from recipes.models import Recipe
+from users.models import Follow, User
+from .utils import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CursorPaginationTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        Recipe.objects.bulk_create(
+            Recipe(name=f'Рецепт {i % 4}', text='Описание', cooking_time=5,
+                   author=cls.author, image='recipes/image.png')
+            for i in range(13)
+        )
+        now = timezone.now()
+        for i, pk in enumerate(Recipe.objects.values_list('pk', flat=True)
+                               .order_by('pk')):
+            Recipe.objects.filter(pk=pk).update(
+                pub_date=now - timedelta(minutes=i // 5))
+        cls.recipes = list(Recipe.objects.order_by(
+            '-pub_date', 'name', 'id').values_list('id', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        tag_catalog.data
+
+    def walk(self, url, key):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            pages.append([item['id'] for item in response.data['results']])
+            url = response.data[key]
+        return pages, response
+
+    def test_recipes_forward_and_back(self):
+        pages, response = self.walk(
+            reverse('api:recipes-list') + '?cursor=&limit=4', 'next')
+        self.assertEqual(sum(pages, []), self.recipes)
+        self.assertEqual([len(page) for page in pages], [4, 4, 4, 1])
+        back, response = self.walk(response.data['previous'], 'previous')
+        self.assertEqual(back, pages[-2::-1])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_recipes_query_count(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('api:recipes-list'),
+                                       {'cursor': '', 'limit': 4})
+        self.assertIsNone(response.data['previous'])
+
+    def test_subscriptions(self):
+        authors = User.objects.bulk_create(
+            User(username=f'writer{i}', email=f'writer{i}@example.com')
+            for i in range(7)
+        )
+        Follow.objects.bulk_create(
+            Follow(follower=self.user, recipe_author=author)
+            for author in authors
+        )
+        self.client.force_authenticate(self.user)
+        pages, _ = self.walk(
+            reverse('api:users-subscriptions') + '?cursor=&limit=3', 'next')
+        self.assertEqual(sum(pages, []), [author.id for author in authors])
+
+    def test_invalid_cursor(self):
+        for cursor in ('abc', 'e30=', 'eyJwIjogWzFdLCAiciI6IDB9'):
+            response = self.client.get(reverse('api:recipes-list'),
+                                       {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_limited(self):
+        Recipe.objects.bulk_create(
+            Recipe(name='Рецепт', text='Описание', cooking_time=5,
+                   author=self.author, image='recipes/image.png')
+            for _ in range(MAX_PAGE_SIZE)
+        )
+        for params in ({}, {'cursor': ''}):
+            response = self.client.get(reverse('api:recipes-list'),
+                                       {'limit': MAX_PAGE_SIZE * 2, **params})
+            self.assertEqual(len(response.data['results']), MAX_PAGE_SIZE)
+        self.assertEqual(response.data.get('count'), None)
+        response = self.client.get(reverse('api:recipes-list'), {'page': 2})
+        self.assertEqual(response.data['count'], MAX_PAGE_SIZE + 13)
+
+    def test_count_is_cached(self):
+        url = reverse('api:recipes-list')
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'limit': 4})
+        self.assertEqual(response.data['count'], 13)
+        self.assertTrue(response.data['count_exact'])
+        Recipe.objects.filter(pk=self.recipes[0]).delete()
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'limit': 4, 'page': 4})
+        self.assertEqual(response.status_code, 404)
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'limit': 4, 'page': 3})
+        self.assertEqual(response.data['count'], 13)
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIsNone(response.data['next'])
+
+    def test_estimated_count(self):
+        with mock.patch.object(CachedCountPaginator, 'estimate',
+                               return_value=(5, False)):
+            response = self.client.get(reverse('api:recipes-list'),
+                                       {'limit': 4, 'page': 4})
+        self.assertEqual(response.data['count'], 5)
+        self.assertFalse(response.data['count_exact'])
+        self.assertEqual(response.data['results'][0]['id'],
+                         self.recipes[-1])
+        self.assertIsNone(response.data['next'])
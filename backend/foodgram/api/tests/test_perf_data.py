@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from api.management.commands import benchmark_concurrency
+from api.management.commands.benchmark_api import (SKIPPED, Command,
+                                                   api_routes, percentile)
+
+from recipes import counters
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from recipes.search import search_recipes
+from users.models import Follow, User
+
+
+class SeedPerfDataTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(40))
+        for number, slug in enumerate(('breakfast', 'lunch', 'dinner')):
+            Tag.objects.create(name=slug, color=f'#00000{number}', slug=slug)
+
+    def seed(self, **options):
+        call_command('seed_perf_data', users=30, recipes=80, chunk_size=50,
+                     stdout=StringIO(), **options)
+
+    def snapshot(self):
+        return (
+            list(Recipe.objects.order_by('pk').values_list(
+                'author__username', 'cooking_time', 'tags_mask',
+                'favorites_count', 'in_carts_count')),
+            list(IngredientAmount.objects.order_by('pk').values_list(
+                'recipe_id', 'ingredient_id', 'amount')),
+            list(Follow.objects.order_by('pk').values_list(
+                'follower__username', 'recipe_author__username')),
+        )
+
+    def test_data_is_consistent(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Recipe.objects.count(), 80)
+        for model in counters.COUNTERS:
+            ids = list(model.objects.values_list('pk', flat=True))
+            self.assertEqual(
+                {obj['pk']: {field: obj[field]
+                             for field in counters.COUNTERS[model]}
+                 for obj in model.objects.values('pk',
+                                                 *counters.COUNTERS[model])},
+                counters.actual_counts(model, ids))
+        call_command('check_shopping_lists', stdout=StringIO())
+        masks = dict.fromkeys(Recipe.objects.values_list('pk', flat=True), 0)
+        for recipe_id, bit in Recipe.tags.through.objects.values_list(
+                'recipe_id', 'tag__bit'):
+            masks[recipe_id] |= 1 << bit
+        self.assertEqual(dict(Recipe.objects.values_list('pk', 'tags_mask')),
+                         masks)
+        recipe = Recipe.objects.order_by('pk').first()
+        self.assertIn(recipe, search_recipes(Recipe.objects.all(),
+                                             recipe.name))
+        self.client.force_authenticate(User.objects.first())
+        response = self.client.get(reverse('api:users-subscriptions'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_same_seed_gives_same_data(self):
+        self.seed(seed=3)
+        first = self.snapshot()
+        Recipe.objects.all().delete()
+        User.objects.all().delete()
+        self.seed(seed=3)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_existing_prefix_is_rejected(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+
+class BenchmarkHelpersTest(SimpleTestCase):
+
+    def test_routes(self):
+        routes = api_routes()
+        self.assertIn(('recipes-list', 'GET'), routes)
+        self.assertIn(('recipes-favorite', 'DELETE'), routes)
+        self.assertIn(('metrics', 'GET'), routes)
+        self.assertNotIn(('recipes-detail', 'PUT'), routes)
+        self.assertLessEqual(SKIPPED, routes)
+
+    def test_percentile(self):
+        values = list(range(1, 21))
+        self.assertEqual(percentile(values, 50), 10)
+        self.assertEqual(percentile(values, 95), 19)
+        self.assertEqual(percentile([3], 95), 3)
+
+    def test_compare(self):
+        baseline = {'1:1': {'GET tags-list': {
+            'queries': 1, 'p50_ms': 1.0, 'p95_ms': 10.0}}}
+        command = Command(stdout=StringIO())
+        command.compare({'1:1': {'GET tags-list': {
+            'queries': 1, 'p50_ms': 1.0, 'p95_ms': 19.0}},
+            '2:2': {'GET tags-list': {
+                'queries': 5, 'p50_ms': 1.0, 'p95_ms': 50.0}}},
+            baseline, tolerance=0.5, slack_ms=5)
+        for result in ({'queries': 2, 'p50_ms': 1.0, 'p95_ms': 10.0},
+                       {'queries': 1, 'p50_ms': 1.0, 'p95_ms': 21.0}):
+            with self.assertRaises(CommandError):
+                command.compare({'1:1': {'GET tags-list': result}},
+                                baseline, tolerance=0.5, slack_ms=5)
+
+    def test_first_run_records_baseline(self):
+        baseline = Path(tempfile.mkdtemp()) / 'baseline.json'
+        self.addCleanup(os.rmdir, baseline.parent)
+        self.addCleanup(baseline.unlink)
+        result = {'GET tags-list': {
+            'queries': 1, 'p50_ms': 1.0, 'p95_ms': 10.0}}
+        with mock.patch.object(Command, 'run_scale', return_value=result):
+            out = StringIO()
+            call_command('benchmark_api', scales=['1:1'],
+                         baseline=baseline, stdout=out)
+            self.assertIn('Базовая линия записана', out.getvalue())
+            self.assertEqual(json.loads(baseline.read_text()),
+                             {'1:1': result})
+            out = StringIO()
+            call_command('benchmark_api', scales=['1:1'],
+                         baseline=baseline, stdout=out)
+            self.assertIn('Регрессий относительно базовой линии нет',
+                          out.getvalue())
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path == '/ok' else 404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ConcurrencyBenchmarkTest(SimpleTestCase):
+
+    def test_run_load(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            latencies, errors = benchmark_concurrency.run_load(
+                server.server_address[1], {}, ['/ok', '/missing'], 4, 0.3)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.assertTrue(latencies)
+        self.assertTrue(errors)
+
+    def test_report(self):
+        command = benchmark_concurrency.Command(stdout=StringIO())
+        results = {
+            ('wsgi', 8): command.summary([0.01] * 50, 0, duration=10),
+            ('asgi', 8): command.summary([0.02] * 100, 3, duration=10),
+        }
+        self.assertEqual(results['asgi', 8]['rps'], 10.0)
+        command.report(results, ['wsgi', 'asgi'], [8])
+        self.assertIn('asgi/wsgi: 2.00', command.stdout.getvalue())
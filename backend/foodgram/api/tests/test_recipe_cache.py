@@ -0,0 +1,138 @@
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from api import recipe_cache
+from recipes.models import (Favorites, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+from .utils import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecipeDetailCacheTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.recipe = Recipe.objects.create(
+            name='Каша', text='Описание', cooking_time=5,
+            author=cls.author, image='recipes/image.png')
+        Favorites.objects.create(user=cls.reader, recipe=cls.recipe)
+        Follow.objects.create(follower=cls.reader, recipe_author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('api:recipes-detail', args=(self.recipe.id,))
+
+    def test_cached_response_with_user_fields(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url).data
+        self.assertFalse(data['is_favorited'])
+        self.assertFalse(data['author']['is_subscribed'])
+        self.client.force_authenticate(self.reader)
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url).data
+        self.assertTrue(data['is_favorited'])
+        self.assertFalse(data['is_in_shopping_cart'])
+        self.assertTrue(data['author']['is_subscribed'])
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        self.assertTrue(self.client.get(self.url).data['is_in_shopping_cart'])
+        self.client.force_authenticate(self.author)
+        data = self.client.get(self.url).data
+        self.assertFalse(data['is_favorited'])
+        self.assertFalse(data['author']['is_subscribed'])
+
+    def test_save_invalidates(self):
+        self.assertEqual(self.client.get(self.url).data['name'], 'Каша')
+        self.recipe.name = 'Овсянка'
+        self.recipe.save()
+        self.assertEqual(self.client.get(self.url).data['name'], 'Овсянка')
+
+    def test_tag_rename_invalidates(self):
+        tag = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                 slug='breakfast')
+        self.recipe.tags.add(tag)
+        self.client.get(self.url)
+        tag.name = 'Ранний завтрак'
+        tag.save()
+        self.assertEqual(self.client.get(self.url).data['tags'][0]['name'],
+                         'Ранний завтрак')
+
+    def test_ingredient_rename_invalidates(self):
+        ingredient = Ingredient.objects.create(name='овёс',
+                                               measurement_unit='г')
+        IngredientAmount.objects.create(recipe=self.recipe,
+                                        ingredient=ingredient, amount=100)
+        self.client.get(self.url)
+        ingredient.name = 'овсяные хлопья'
+        ingredient.save()
+        self.assertEqual(
+            self.client.get(self.url).data['ingredients'][0]['name'],
+            'овсяные хлопья')
+
+    def test_author_rename_invalidates(self):
+        self.client.get(self.url)
+        updated_at = Recipe.objects.get(pk=self.recipe.pk).updated_at
+        self.author.save(update_fields=('last_login',))
+        self.assertEqual(Recipe.objects.get(pk=self.recipe.pk).updated_at,
+                         updated_at)
+        self.author.username = 'chef'
+        self.author.save()
+        self.assertEqual(
+            self.client.get(self.url).data['author']['username'], 'chef')
+
+    def test_missing_recipe(self):
+        for pk in (0, 'abc'):
+            response = self.client.get(
+                reverse('api:recipes-detail', args=(pk,)))
+            self.assertEqual(response.status_code, 404)
+
+    def test_single_flight(self):
+        build = mock.Mock(return_value={'name': 'Каша'})
+        self.assertEqual(recipe_cache.get_or_build('key', build),
+                         {'name': 'Каша'})
+        self.assertEqual(recipe_cache.get_or_build('key', build),
+                         {'name': 'Каша'})
+        build.assert_called_once()
+
+    def test_waits_for_lock_holder(self):
+        cache.add('other:lock', True)
+
+        def sleep(seconds):
+            cache.set('other', {'name': 'Каша'})
+
+        build = mock.Mock()
+        with mock.patch('api.recipe_cache.sleep', sleep):
+            self.assertEqual(recipe_cache.get_or_build('other', build),
+                             {'name': 'Каша'})
+        build.assert_not_called()
+
+    def test_no_lock_without_atomic_add(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}):
+                cache.add('file:lock', True)
+                build = mock.Mock(return_value={'name': 'Каша'})
+                self.assertEqual(recipe_cache.get_or_build('file', build),
+                                 {'name': 'Каша'})
+                build.assert_called_once()
+                self.assertEqual(cache.get('file'), {'name': 'Каша'})
+
+    def test_key_includes_scheme(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url, secure=True)
+        self.assertTrue(response.data['image'].startswith('https://'))
+        self.assertTrue(self.client.get(self.url).data['image']
+                        .startswith('http://'))
@@ -0,0 +1,404 @@
+import re
+from io import BytesIO, StringIO
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from pypdf import PdfReader
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.serializers import RecipeCreateSerializer
+from api.views import RecipeViewSet
+from recipes import shopping_list
+from recipes.caches import tag_catalog
+from recipes.models import (Favorites,
+                            Ingredient,
+                            IngredientAmount,
+                            Recipe,
+                            ShoppingCart,
+                            ShoppingListItem,
+                            Tag)
+from users.models import Follow, User
+from .utils import IMAGE, LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecipeListQueriesTest(APITestCase):
+    AUTHENTICATED_QUERIES = 5
+    ANONYMOUS_QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}',
+                                     email=f'author{i}@example.com',
+                                     password='pass')
+            for i in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                               slug=f'tag{i}')
+            for i in range(2)
+        ]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(5)
+        )
+        Follow.objects.create(follower=cls.user,
+                              recipe_author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        tag_catalog.data
+
+    def create_recipes(self, count):
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {i}', text='Описание', cooking_time=10,
+                author=self.authors[i % len(self.authors)],
+                image='recipes/image.png')
+            recipe.tags.set(self.tags)
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(recipe=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in self.ingredients
+            )
+            if i % 2:
+                Favorites.objects.create(user=self.user, recipe=recipe)
+            else:
+                ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def get_list(self, limit):
+        return self.client.get(reverse('api:recipes-list'), {'limit': limit})
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self.client.force_authenticate(self.user)
+        self.create_recipes(6)
+        with self.assertNumQueries(self.AUTHENTICATED_QUERIES):
+            response = self.get_list(6)
+        self.assertEqual(len(response.data['results']), 6)
+        self.create_recipes(24)
+        with self.assertNumQueries(self.AUTHENTICATED_QUERIES - 1):
+            response = self.get_list(30)
+        self.assertEqual(len(response.data['results']), 30)
+        self.assertEqual(response.data['count'], 6)
+
+    def test_anonymous_query_count(self):
+        self.create_recipes(12)
+        with self.assertNumQueries(self.ANONYMOUS_QUERIES):
+            response = self.get_list(12)
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_user_flags(self):
+        self.client.force_authenticate(self.user)
+        self.create_recipes(2)
+        results = self.get_list(2).data['results']
+        for recipe in results:
+            db_recipe = Recipe.objects.get(pk=recipe['id'])
+            self.assertEqual(
+                recipe['is_favorited'],
+                Favorites.objects.filter(user=self.user,
+                                         recipe=db_recipe).exists())
+            self.assertEqual(
+                recipe['is_in_shopping_cart'],
+                ShoppingCart.objects.filter(user=self.user,
+                                            recipe=db_recipe).exists())
+            self.assertEqual(
+                recipe['author']['is_subscribed'],
+                recipe['author']['id'] == self.authors[0].id)
+            self.assertEqual(len(recipe['ingredients']), 5)
+
+
+class ShoppingListDownloadTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass')
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i:03}', measurement_unit='г')
+            for i in range(60)
+        )
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {i}', text='Описание', cooking_time=10,
+                author=cls.user, image='recipes/image.png')
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in ingredients
+            )
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        shopping_list.rebuild([cls.user.id])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def download(self, **params):
+        response = self.client.get(
+            reverse('api:recipes-download-shopping-cart'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_txt(self):
+        response, content = self.download()
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; charset=utf-8')
+        lines = content.decode().splitlines()
+        self.assertEqual(len(lines), 61)
+        self.assertEqual(lines[1], 'Ингредиент 000 20г')
+
+    def test_csv(self):
+        response, content = self.download(format='csv')
+        self.assertIn('shopping_cart.csv', response['Content-Disposition'])
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[1], 'Ингредиент 000,20,г')
+
+    def test_pdf(self):
+        response, content = self.download(format='pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF-1.4'))
+        self.assertTrue(content.endswith(b'%%EOF\n'))
+        startxref = int(content.rsplit(b'startxref\n', 1)[1].split()[0])
+        xref = content[startxref:].split(b'trailer')[0].splitlines()[3:]
+        for number, entry in enumerate(xref, start=1):
+            offset = int(entry.split()[0])
+            self.assertTrue(content[offset:].startswith(b'%d 0 obj' % number))
+        self.assertIn(b'/Count 2', content)
+
+    def test_pdf_text(self):
+        Ingredient.objects.filter(name='Ингредиент 000').update(
+            name='Щавель ёжиковый')
+        _, content = self.download(format='pdf')
+        pages = [page.extract_text().splitlines()
+                 for page in PdfReader(BytesIO(content)).pages]
+        self.assertEqual(pages[0][:2], ['Необходимые ингредиенты для покупки:',
+                                        'Ингредиент 001 20г'])
+        self.assertEqual(pages[1][-1], 'Щавель ёжиковый 20г')
+
+    def test_unmatched_accept_gets_txt(self):
+        response = self.client.get(
+            reverse('api:recipes-download-shopping-cart'),
+            headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('shopping_cart.txt', response['Content-Disposition'])
+        response = self.client.get(
+            reverse('api:recipes-download-shopping-cart'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(ASGI_MODE=True)
+    async def test_asgi_streams_async_iterator(self):
+        token = await Token.objects.acreate(user=self.user)
+        response = await self.async_client.get(
+            reverse('api:recipes-download-shopping-cart'),
+            headers={'Authorization': f'Token {token.key}'})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk
+                            in response.streaming_content])
+        self.assertEqual(content.decode().splitlines()[1],
+                         'Ингредиент 000 20г')
+
+    def test_empty_cart(self):
+        ShoppingCart.objects.all().delete()
+        response = self.client.get(
+            reverse('api:recipes-download-shopping-cart'))
+        self.assertEqual(response.status_code, 400)
+
+
+class ShoppingListMixin:
+    """Пользователь с двумя рецептами и проверка итогов списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='pass')
+        cls.tag = Tag.objects.create(name='Завтрак', color='#000000',
+                                     slug='breakfast')
+        cls.flour, cls.milk, cls.egg = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in (('мука', 'г'), ('молоко', 'мл'),
+                               ('яйцо', 'шт')))
+        cls.pancakes = cls.create_recipe({cls.flour: 200, cls.milk: 300})
+        cls.omelette = cls.create_recipe({cls.milk: 50, cls.egg: 3})
+
+    @classmethod
+    def create_recipe(cls, amounts):
+        recipe = Recipe.objects.create(
+            name='Рецепт', text='Описание', cooking_time=10,
+            author=cls.user, image='recipes/image.png')
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in amounts.items()
+        )
+        return recipe
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def cart_url(self, recipe):
+        return reverse('api:recipes-shopping-cart', args=(recipe.id,))
+
+    def assertTotals(self, expected):
+        self.assertEqual(
+            dict(ShoppingListItem.objects.values_list('ingredient__name',
+                                                      'amount')),
+            expected)
+        call_command('check_shopping_lists', stdout=StringIO())
+
+
+class ShoppingListTotalsTest(ShoppingListMixin, APITestCase):
+
+    def test_cart_changes_update_totals(self):
+        self.client.post(self.cart_url(self.pancakes))
+        self.client.post(self.cart_url(self.omelette))
+        self.assertTotals({'мука': 200, 'молоко': 350, 'яйцо': 3})
+        self.client.delete(self.cart_url(self.pancakes))
+        self.assertTotals({'молоко': 50, 'яйцо': 3})
+
+    def test_recipe_update_changes_totals(self):
+        self.client.post(self.cart_url(self.pancakes))
+        response = self.client.patch(
+            reverse('api:recipes-detail', args=(self.pancakes.id,)),
+            {'ingredients': [{'id': self.flour.id, 'amount': 250},
+                             {'id': self.egg.id, 'amount': 2}],
+             'tags': [self.tag.id], 'name': 'Блины', 'text': 'Описание',
+             'cooking_time': 20},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTotals({'мука': 250, 'яйцо': 2})
+
+    def test_recipe_delete_changes_totals(self):
+        self.client.post(self.cart_url(self.pancakes))
+        self.client.post(self.cart_url(self.omelette))
+        self.client.delete(
+            reverse('api:recipes-detail', args=(self.omelette.id,)))
+        self.assertTotals({'мука': 200, 'молоко': 300})
+
+    def test_check_and_rebuild(self):
+        self.client.post(self.cart_url(self.pancakes))
+        ShoppingListItem.objects.filter(ingredient=self.milk).update(
+            amount=1)
+        with self.assertRaises(CommandError):
+            call_command('check_shopping_lists', stdout=StringIO())
+        call_command('rebuild_shopping_lists', chunk_size=1,
+                     stdout=StringIO())
+        self.assertTotals({'мука': 200, 'молоко': 300})
+
+
+class RecipeUpdateTest(ShoppingListMixin, APITestCase):
+
+    def patch(self, amounts, name='Блины'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                reverse('api:recipes-detail', args=(self.pancakes.id,)),
+                {'ingredients': [{'id': ingredient.id, 'amount': amount}
+                                 for ingredient, amount in amounts.items()],
+                 'tags': [self.tag.id], 'name': name, 'text': 'Описание',
+                 'cooking_time': 20},
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {item['name']: item['amount']
+             for item in response.data['ingredients']},
+            {ingredient.name: amount
+             for ingredient, amount in amounts.items()})
+        return [query['sql'] for query in queries
+                if re.match(r'(INSERT INTO|UPDATE|DELETE FROM) '
+                            r'"recipes_ingredientamount"', query['sql'])]
+
+    def test_unchanged_ingredients_are_not_written(self):
+        self.client.post(self.cart_url(self.pancakes))
+        self.patch({self.flour: 200, self.milk: 300})
+        before = list(IngredientAmount.objects.order_by('pk').values_list(
+            'pk', 'ingredient_id', 'amount'))
+        self.assertEqual(self.patch({self.flour: 200, self.milk: 300},
+                                    name='Оладьи'), [])
+        self.assertEqual(
+            list(IngredientAmount.objects.order_by('pk').values_list(
+                'pk', 'ingredient_id', 'amount')), before)
+
+    def test_only_differences_are_written(self):
+        self.client.post(self.cart_url(self.pancakes))
+        flour = IngredientAmount.objects.get(recipe=self.pancakes,
+                                             ingredient=self.flour)
+        writes = self.patch({self.flour: 250, self.egg: 2})
+        self.assertEqual(sorted(sql.split()[0] for sql in writes),
+                         ['DELETE', 'INSERT', 'UPDATE'])
+        flour.refresh_from_db()
+        self.assertEqual(flour.amount, 250)
+        self.assertTotals({'мука': 250, 'яйцо': 2})
+
+    def test_diff_uses_current_rows(self):
+        self.client.post(self.cart_url(self.pancakes))
+        recipe = RecipeViewSet.queryset.get(pk=self.pancakes.pk)
+        # Другой запрос меняет состав после чтения рецепта ViewSet.
+        IngredientAmount.objects.filter(
+            recipe=self.pancakes, ingredient=self.milk).delete()
+        IngredientAmount.objects.create(
+            recipe=self.pancakes, ingredient=self.egg, amount=1)
+        shopping_list.rebuild([self.user.id])
+        RecipeCreateSerializer().update_ingredients(
+            recipe, [{'id': self.flour, 'amount': 200},
+                     {'id': self.egg, 'amount': 2}])
+        self.assertEqual(
+            dict(IngredientAmount.objects.filter(recipe=self.pancakes)
+                 .values_list('ingredient__name', 'amount')),
+            {'мука': 200, 'яйцо': 2})
+
+
+class RecipeValidationTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass')
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                               slug=f'tag-{number}')
+            for number in range(5)
+        ]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(30))
+
+    def validate(self, ingredient_ids, tag_ids):
+        request = APIRequestFactory().post('/')
+        request.user = self.user
+        return RecipeCreateSerializer(data={
+            'ingredients': [{'id': pk, 'amount': 10}
+                            for pk in ingredient_ids],
+            'tags': tag_ids, 'image': IMAGE, 'name': 'Рецепт',
+            'text': 'Описание', 'cooking_time': 10,
+        }, context={'request': request})
+
+    def test_ids_are_resolved_with_one_query_each(self):
+        for count in (1, 30):
+            serializer = self.validate(
+                [ingredient.id for ingredient in self.ingredients[:count]],
+                [tag.id for tag in self.tags[:count]])
+            with self.assertNumQueries(2):
+                self.assertTrue(serializer.is_valid(), serializer.errors)
+            self.assertEqual(
+                [item['id'] for item
+                 in serializer.validated_data['ingredients']],
+                self.ingredients[:count])
+            self.assertEqual(serializer.validated_data['tags'],
+                             self.tags[:count])
+
+    def test_unknown_ids_are_reported_together(self):
+        serializer = self.validate(
+            [self.ingredients[0].id, 1000, 1001], [self.tags[0].id])
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['ingredients'],
+                         ['Ингредиенты не найдены: 1000, 1001.'])
+        serializer = self.validate([self.ingredients[0].id], [998, 999])
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['tags'],
+                         ['Теги не найдены: 998, 999.'])
@@ -0,0 +1,106 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.caches import tag_catalog
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from recipes.search import update_search_index
+from users.models import User
+from .utils import IMAGE, TempMediaMixin
+
+
+class RecipeSearchTest(TempMediaMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.salt = Ingredient.objects.create(name='соль',
+                                             measurement_unit='г')
+        cls.buckwheat = Ingredient.objects.create(name='гречка',
+                                                  measurement_unit='г')
+        cls.tag = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                     slug='breakfast')
+
+    def setUp(self):
+        tag_catalog.bump()
+
+    def create_recipe(self, name, text, ingredients):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                name=name, text=text, cooking_time=5, author=self.author,
+                image='recipes/image.png')
+            for ingredient in ingredients:
+                IngredientAmount.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1)
+        return recipe
+
+    def search(self, text):
+        response = self.client.get(reverse('api:recipes-list'),
+                                   {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_search_name_text_and_ingredients(self):
+        self.create_recipe('Каша гречневая', 'Сварить крупу', [self.salt])
+        self.create_recipe('Суп', 'Гречка в супе тоже бывает', [self.salt])
+        self.create_recipe('Омлет', 'Взбить яйца', [self.buckwheat])
+        self.assertEqual(self.search('гречка'), ['Суп', 'Омлет'])
+        self.assertEqual(self.search('каша'), ['Каша гречневая'])
+        self.assertEqual(self.search('соль суп'), ['Суп'])
+        self.assertEqual(self.search('"*)('), [])
+        self.assertEqual(len(self.search(' ')), 3)
+
+    def test_ranking(self):
+        self.create_recipe('Салат', 'Овощи и соль', [])
+        self.create_recipe('Соль', 'Соль крупная', [self.salt])
+        self.assertEqual(self.search('соль'), ['Соль', 'Салат'])
+
+    def test_index_follows_changes(self):
+        recipe = self.create_recipe('Каша', 'Описание', [self.salt])
+        recipe.name = 'Плов'
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        self.assertEqual(self.search('каша'), [])
+        self.assertEqual(self.search('плов'), ['Плов'])
+        self.salt.name = 'перец'
+        self.salt.save()
+        self.assertEqual(self.search('перец'), ['Плов'])
+        recipe.delete()
+        self.assertEqual(self.search('плов'), [])
+
+    def test_api_writes_reindex_once(self):
+        self.client.force_authenticate(self.author)
+        with mock.patch('recipes.search.update_search_index',
+                        wraps=update_search_index) as update:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('api:recipes-list'), {
+                    'name': 'Каша', 'text': 'Описание', 'cooking_time': 5,
+                    'image': IMAGE, 'tags': [self.tag.id],
+                    'ingredients': [{'id': self.buckwheat.id, 'amount': 1}],
+                }, format='json')
+            self.assertEqual(response.status_code, 201)
+            update.assert_called_once_with([response.data['id']])
+            self.assertEqual(self.search('гречка'), ['Каша'])
+            update.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    reverse('api:recipes-detail', args=(response.data['id'],)),
+                    {'tags': [self.tag.id],
+                     'ingredients': [{'id': self.salt.id, 'amount': 1},
+                                     {'id': self.buckwheat.id, 'amount': 2}]},
+                    format='json')
+            self.assertEqual(response.status_code, 200)
+            update.assert_called_once_with([response.data['id']])
+        self.assertEqual(self.search('соль'), ['Каша'])
+
+    def test_rebuild_command(self):
+        Recipe.objects.bulk_create([Recipe(
+            name='Каша', text='Описание', cooking_time=5, author=self.author,
+            image='recipes/image.png')])
+        self.assertEqual(self.search('каша'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('каша'), ['Каша'])
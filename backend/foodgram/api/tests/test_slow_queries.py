@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from api import slow_queries
+from recipes.models import Recipe
+from users.models import User
+
+
+class FingerprintTest(SimpleTestCase):
+
+    def test_values_are_removed(self):
+        first = slow_queries.fingerprint(
+            'SELECT "id" FROM "recipes_recipe" WHERE "id" IN (%s, %s) '
+            "AND name = 'Блины' LIMIT 21")
+        second = slow_queries.fingerprint(
+            'SELECT "id" FROM "recipes_recipe"\n WHERE "id" IN (%s) '
+            "AND name = 'Оладьи' LIMIT 10")
+        self.assertEqual(first, second)
+        self.assertEqual(
+            first[1], 'SELECT "id" FROM "recipes_recipe" WHERE "id" IN (...) '
+            'AND name = ? LIMIT ?')
+
+
+class SlowQueryLogTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass')
+        cls.recipe = Recipe.objects.create(
+            name='Блины', text='Описание', cooking_time=10,
+            author=cls.user, image='recipes/image.png')
+
+    def setUp(self):
+        file, self.path = tempfile.mkstemp()
+        os.close(file)
+        self.addCleanup(os.remove, self.path)
+        slow_queries._explained_at.clear()
+
+    def records(self):
+        with open(self.path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_disabled_by_default(self):
+        with override_settings(SLOW_QUERY_LOG=self.path):
+            self.client.get(reverse('api:recipes-list'))
+        self.assertEqual(self.records(), [])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6,
+                       SLOW_QUERY_EXPLAIN_RATE=1,
+                       SLOW_QUERY_EXPLAIN_INTERVAL=60)
+    def test_slow_queries_are_recorded_with_plans(self):
+        with override_settings(SLOW_QUERY_LOG=self.path):
+            self.client.get(reverse('api:recipes-list'))
+            self.client.get(reverse('api:recipes-list'))
+            self.client.force_authenticate(self.user)
+            self.client.post(
+                reverse('api:recipes-favorite', args=(self.recipe.id,)))
+        records = self.records()
+        self.assertEqual(
+            {record['view'] for record in records},
+            {'RecipeViewSet.list', 'RecipeViewSet.favorite'})
+        selects = [record for record in records
+                   if record['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for record in selects:
+            self.assertNotIn('%s', record['sql'])
+        planned = [record for record in selects if record['plan']]
+        self.assertEqual(
+            len(planned), len({record['fingerprint'] for record in selects}))
+        self.assertFalse(any(record['plan'] for record in records
+                             if record['sql'].startswith('INSERT')))
+        self.assertTrue(Recipe.objects.filter(
+            favorites__user=self.user).exists())
+
+        stdout = StringIO()
+        call_command('slow_queries', path=self.path, plans=True, limit=3,
+                     view='RecipeViewSet.list', stdout=stdout)
+        report = stdout.getvalue()
+        self.assertTrue(report.startswith('1. '))
+        self.assertIn('RecipeViewSet.list (2)', report)
+        self.assertNotIn('RecipeViewSet.favorite', report)
@@ -0,0 +1,137 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+from .utils import IMAGE, LOCMEM_CACHES, TempMediaMixin
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TagCatalogTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.breakfast = Tag.objects.create(name='Завтрак', color='#E26C2D',
+                                           slug='breakfast')
+        cls.dinner = Tag.objects.create(name='Ужин', color='#8775D2',
+                                        slug='dinner')
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        for tag in (cls.breakfast, cls.dinner):
+            recipe = Recipe.objects.create(
+                name=tag.name, text='Описание', cooking_time=10,
+                author=author, image='recipes/image.png')
+            recipe.tags.set((tag,))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_conditional_get(self):
+        url = reverse('api:tags-list')
+        response = self.client.get(url)
+        self.assertEqual([tag['slug'] for tag in response.data],
+                         ['breakfast', 'dinner'])
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+    def test_recipe_filter_uses_cached_tags(self):
+        url = reverse('api:recipes-list')
+        self.client.get(reverse('api:tags-list'))
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'tags': ['breakfast']})
+        self.assertEqual([recipe['name'] for recipe
+                          in response.data['results']], ['Завтрак'])
+        response = self.client.get(url, {'tags': ['breakfast', 'dinner']})
+        self.assertEqual(response.data['count'], 2)
+        response = self.client.get(url, {'tags': ['unknown']})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TagsMaskTest(TempMediaMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.breakfast, cls.lunch, cls.dinner = (
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (('Завтрак', '#E26C2D', 'breakfast'),
+                                      ('Обед', '#49B64E', 'lunch'),
+                                      ('Ужин', '#8775D2', 'dinner'))
+        )
+        cls.ingredient = Ingredient.objects.create(name='соль',
+                                                   measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.author)
+
+    def create_recipe(self, name, tags):
+        response = self.client.post(
+            reverse('api:recipes-list'),
+            {'name': name, 'text': 'Описание', 'cooking_time': 5,
+             'tags': [tag.id for tag in tags],
+             'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+             'image': IMAGE},
+            format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Recipe.objects.get(pk=response.data['id'])
+
+    def filter_names(self, **params):
+        response = self.client.get(reverse('api:recipes-list'), params)
+        return sorted(recipe['name'] for recipe in response.data['results'])
+
+    def test_any_and_all_filters(self):
+        self.create_recipe('Каша', (self.breakfast,))
+        self.create_recipe('Суп', (self.lunch, self.dinner))
+        self.create_recipe('Омлет', (self.breakfast, self.dinner))
+        self.assertEqual(self.filter_names(tags=['breakfast', 'lunch']),
+                         ['Каша', 'Омлет', 'Суп'])
+        self.assertEqual(self.filter_names(tags_all=['breakfast', 'dinner']),
+                         ['Омлет'])
+        self.assertEqual(self.filter_names(tags=['lunch'],
+                                           tags_all=['dinner']),
+                         ['Суп'])
+
+    def test_mask_follows_tag_changes(self):
+        recipe = self.create_recipe('Каша', (self.breakfast,))
+        self.assertEqual(recipe.tags_mask, self.breakfast.mask)
+        self.client.patch(
+            reverse('api:recipes-detail', args=(recipe.id,)),
+            {'name': 'Каша', 'text': 'Описание', 'cooking_time': 5,
+             'tags': [self.lunch.id, self.dinner.id],
+             'ingredients': [{'id': self.ingredient.id, 'amount': 1}]},
+            format='json')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tags_mask,
+                         self.lunch.mask | self.dinner.mask)
+        self.breakfast.recipes.add(recipe)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tags_mask, self.breakfast.mask
+                         | self.lunch.mask | self.dinner.mask)
+        self.lunch.delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tags_mask,
+                         self.breakfast.mask | self.dinner.mask)
+        self.dinner.recipes.clear()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.tags_mask, self.breakfast.mask)
+
+    def test_free_bit_is_reused(self):
+        bit = self.lunch.bit
+        self.lunch.delete()
+        tag = Tag.objects.create(name='Перекус', color='#000000',
+                                 slug='snack')
+        self.assertEqual(tag.bit, bit)
@@ -0,0 +1,95 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from recipes import counters
+from recipes.models import Recipe
+from users.models import Follow, User
+
+
+class UserListQueriesTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}',
+                                     email=f'author{i}@example.com',
+                                     password='pass')
+            for i in range(20)
+        ]
+        Follow.objects.bulk_create(
+            Follow(follower=cls.user, recipe_author=author)
+            for author in cls.authors[::2]
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_subscriptions_are_loaded_once(self):
+        for limit in (5, 21):
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('api:users-list'),
+                                           {'limit': limit})
+            self.assertEqual(len(response.data['results']), limit)
+        subscribed = {author.id for author in self.authors[::2]}
+        for user in response.data['results']:
+            self.assertEqual(user['is_subscribed'], user['id'] in subscribed)
+
+    def test_me(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('api:users-me'))
+        self.assertFalse(response.data['is_subscribed'])
+
+
+class SubscriptionsQueriesTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}',
+                                     email=f'author{i}@example.com',
+                                     password='pass')
+            for i in range(12)
+        ]
+        Follow.objects.bulk_create(
+            Follow(follower=cls.user, recipe_author=author)
+            for author in cls.authors if author != cls.authors[3]
+        )
+        Recipe.objects.bulk_create(
+            Recipe(name=f'Рецепт {i}', text='Описание', cooking_time=5,
+                   author=author, image='recipes/image.png')
+            for i, author in enumerate(cls.authors)
+            for _ in range(i % 4)
+        )
+        counters.repair(User, [author.pk for author in cls.authors])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_page_size_does_not_change_query_count(self):
+        for limit in (3, 11):
+            with self.assertNumQueries(3):
+                response = self.client.get(
+                    reverse('api:users-subscriptions'),
+                    {'limit': limit, 'recipes_limit': 2})
+            self.assertEqual(len(response.data['results']), limit)
+        for author in response.data['results']:
+            recipes_count = Recipe.objects.filter(
+                author_id=author['id']).count()
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], recipes_count)
+            self.assertEqual(len(author['recipes']), min(recipes_count, 2))
+
+    def test_subscribe_response(self):
+        with self.assertNumQueries(7):
+            response = self.client.post(
+                reverse('api:users-subscribe', args=(self.authors[3].id,))
+                + '?recipes_limit=1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['recipes_count'], 3)
+        self.assertEqual(len(response.data['recipes']), 1)
+        self.authors[3].refresh_from_db()
+        self.assertEqual(self.authors[3].followers_count, 1)
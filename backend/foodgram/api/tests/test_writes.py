@@ -0,0 +1,136 @@
+import threading
+from unittest import mock
+
+from django.db import connection, connections
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from api.serializers import FavoriteSerializer, FollowSerializer
+from recipes.models import Favorites, Recipe
+from users.models import Follow, User
+
+
+class SingleStatementWritesTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.recipe = Recipe.objects.create(
+            name='Каша', text='Описание', cooking_time=5, author=cls.author,
+            image='recipes/image.png')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def request(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        statements = [query['sql'] for query in queries
+                      if 'SAVEPOINT' not in query['sql']]
+        return response.status_code, len(statements)
+
+    def test_favorite_and_cart(self):
+        for name in ('favorite', 'shopping-cart'):
+            with self.subTest(name=name):
+                url = reverse(f'api:recipes-{name}', args=(self.recipe.id,))
+                self.assertEqual(self.request('post', url)[0], 201)
+                self.assertEqual(self.request('post', url), (400, 2))
+                self.assertEqual(self.request('delete', url)[0], 204)
+                self.assertEqual(self.request('delete', url), (400, 1))
+        url = reverse('api:recipes-favorite', args=(self.recipe.id,))
+        self.assertEqual(self.request('post', url), (201, 3))
+        self.assertEqual(self.request('delete', url), (204, 2))
+
+    def test_subscribe(self):
+        url = reverse('api:users-subscribe', args=(self.author.id,))
+        self.assertEqual(self.request('post', url)[0], 201)
+        self.assertEqual(self.request('post', url), (400, 2))
+        self.assertEqual(self.request('delete', url), (204, 2))
+        self.assertEqual(self.request('delete', url), (400, 1))
+        url = reverse('api:users-subscribe', args=(self.user.id,))
+        self.assertEqual(self.request('post', url)[0], 400)
+
+    def test_lost_race_returns_400(self):
+        def concurrent_favorite(serializer, data):
+            Favorites.objects.create(user=self.user, recipe=self.recipe)
+            return data
+
+        def concurrent_follow(serializer, data):
+            Follow.objects.create(follower=self.user,
+                                  recipe_author=self.author)
+            return data
+
+        with mock.patch.object(FavoriteSerializer, 'validate',
+                               concurrent_favorite):
+            response = self.client.post(
+                reverse('api:recipes-favorite', args=(self.recipe.id,)))
+        self.assertEqual(response.status_code, 400)
+        with mock.patch.object(FollowSerializer, 'validate',
+                               concurrent_follow):
+            response = self.client.post(
+                reverse('api:users-subscribe', args=(self.author.id,)))
+        self.assertEqual(response.status_code, 400)
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertEqual(self.author.followers_count, 0)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentWritesTest(TransactionTestCase):
+    """Параллельные запросы; нужен сервер БД, на SQLite пропускается."""
+
+    CLIENTS = 4
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        self.recipe = Recipe.objects.create(
+            name='Каша', text='Описание', cooking_time=5, author=self.author,
+            image='recipes/image.png')
+
+    def run_concurrently(self, method, url):
+        barrier = threading.Barrier(self.CLIENTS)
+        statuses = []
+
+        def worker():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                statuses.append(getattr(client, method)(url).status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(self.CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def test_double_clicks(self):
+        for url, created in (
+            (reverse('api:recipes-favorite', args=(self.recipe.id,)), 201),
+            (reverse('api:recipes-shopping-cart', args=(self.recipe.id,)),
+             201),
+            (reverse('api:users-subscribe', args=(self.author.id,)), 201),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.run_concurrently('post', url),
+                                 [created] + [400] * (self.CLIENTS - 1))
+                self.assertEqual(self.run_concurrently('delete', url),
+                                 [204] + [400] * (self.CLIENTS - 1))
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (self.recipe.favorites_count, self.recipe.in_carts_count,
+             self.author.followers_count), (0, 0, 0))
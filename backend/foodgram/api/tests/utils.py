@@ -0,0 +1,21 @@
+import shutil
+import tempfile
+
+from django.test import override_settings
+
+from api.samples import IMAGE, LOCMEM_CACHES  # noqa: F401
+
+
+class TempMediaMixin:
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
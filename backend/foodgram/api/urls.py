@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
+from .metrics import metrics_view
 from .views import (UserViewSet,
                     IngredientViewSet,
                     TagViewSet,
@@ -18,4 +21,8 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
+
+if settings.ASGI_MODE:
+    urlpatterns = async_views.urlpatterns + urlpatterns
@@ -1,4 +1,6 @@
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import (AllowAny,
                                         IsAuthenticated,
                                         IsAuthenticatedOrReadOnly,
@@ -8,19 +10,35 @@ from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
-from django.db.models import Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Value
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 
-from .filters import RecipeFilter, IngredientFilter
-from .paginations import LimitPageNumberPagination
+from . import bulk, recipe_cache
+from .filters import IngredientFilter, RecipeFilter, StableOrderingFilter
+from .paginations import (LimitPageNumberPagination,
+                          RecipePagination,
+                          SubscriptionPagination)
 from .permissions import IsAdminOrAuthorOrReadOnly
+from .renderers import (CsvShoppingListRenderer,
+                        FirstRendererFallback,
+                        PdfShoppingListRenderer,
+                        TxtShoppingListRenderer,
+                        async_chunks)
+from foodgram.constants import INGREDIENTS_SEARCH_LIMIT
+from recipes import counters, shopping_list
+from recipes.caches import ingredient_index, tag_catalog
 from recipes.models import (Tag,
                             Ingredient,
                             Recipe,
                             Favorites,
                             IngredientAmount,
                             ShoppingCart)
-from .serializers import (UserSerializer,
+from .serializers import (BulkIdsSerializer,
+                          UserSerializer,
                           TagSerializer,
                           IngredientSerializer,
                           RecipeSerializer,
@@ -29,7 +47,7 @@ from .serializers import (UserSerializer,
                           FavoriteSerializer,
                           ShoppingCartSerializer,
                           FollowShowSerializer)
-from users.models import User
+from users.models import Follow, User
 
 
 class UserViewSet(UserViewSet):
@@ -37,6 +55,8 @@ class UserViewSet(UserViewSet):
     serializer_class = UserSerializer
     pagination_class = LimitPageNumberPagination
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    filter_backends = (StableOrderingFilter,)
+    ordering_fields = ('username', 'recipes_count', 'followers_count')
 
     def get_permissions(self):
         if self.action == 'me':
@@ -48,7 +68,7 @@ class UserViewSet(UserViewSet):
             permission_classes=(IsAuthenticated,),
             url_path='subscribe',)
     def subscribe(self, request, id):
-        data = {'follower': request.user.id, 'recipe_author': id}
+        data = {'recipe_author': id}
         context = {'request': request}
         serializer = FollowSerializer(data=data, context=context)
         serializer.is_valid(raise_exception=True)
@@ -60,9 +80,12 @@ class UserViewSet(UserViewSet):
             url_path='subscriptions',
             methods=['get'],)
     def subscriptions(self, request):
-        queryset = User.objects.filter(
-            recipeauthor__follower=self.request.user)
-        paginator = LimitPageNumberPagination()
+        queryset = FollowShowSerializer.setup_queryset(
+            self.filter_queryset(User.objects.filter(
+                recipeauthor__follower=self.request.user
+            )),
+            request)
+        paginator = SubscriptionPagination()
         page = paginator.paginate_queryset(queryset, request)
         serializer = FollowShowSerializer(
             page,
@@ -70,16 +93,42 @@ class UserViewSet(UserViewSet):
             context={'request': request})
         return paginator.get_paginated_response(serializer.data)
 
+    @action(detail=False,
+            methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,),
+            url_path='subscriptions/bulk',
+            url_name='subscriptions-bulk')
+    @transaction.atomic
+    def subscriptions_bulk(self, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user = request.user
+        if request.method == 'POST':
+            authors = set(User.objects.filter(pk__in=ids).exclude(pk=user.id)
+                          .values_list('pk', flat=True))
+            changed, results = bulk.add_links(
+                Follow, 'follower_id', 'recipe_author_id', user.id, ids,
+                authors, invalid_ids=(user.id,))
+            delta = 1
+        else:
+            changed, results = bulk.remove_links(
+                Follow, 'follower_id', 'recipe_author_id', user.id, ids)
+            delta = -1
+        counters.change_many(User, changed, 'followers_count', delta)
+        return Response({'results': results})
+
     @subscribe.mapping.delete
+    @transaction.atomic
     def delete_subscribtions(self, request, id):
-        subscription = request.user.follower.filter(
+        deleted, _ = request.user.follower.filter(
             recipe_author_id=id
-        )
-        if not subscription.exists():
+        ).delete()
+        if not deleted:
             return Response({'detail':
                              'Такой подписки нет'},
                             status=status.HTTP_400_BAD_REQUEST)
-        subscription.delete()
+        counters.change(User, id, 'followers_count', -deleted)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -89,37 +138,100 @@ class TagViewSet(ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    @method_decorator(condition(etag_func=tag_catalog.etag,
+                                last_modified_func=tag_catalog.last_modified))
+    def list(self, request):
+        return Response(tag_catalog.all())
+
+    def retrieve(self, request, pk):
+        tag = tag_catalog.get(int(pk)) if pk.isdigit() else None
+        if tag is None:
+            raise NotFound
+        return Response(tag)
+
 
 class IngredientViewSet(ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
-    filter_backends = (IngredientFilter,)
     pagination_class = None
-    search_fields = ('^name',)
+
+    def list(self, request):
+        name = request.query_params.get(IngredientFilter.search_param, '')
+        if name.strip():
+            return Response(ingredient_index.search(
+                name.strip(), INGREDIENTS_SEARCH_LIMIT))
+        return Response(ingredient_index.all())
+
+    def retrieve(self, request, pk):
+        ingredient = ingredient_index.get(int(pk)) if pk.isdigit() else None
+        if ingredient is None:
+            raise NotFound
+        return Response(ingredient)
 
 
 class RecipeViewSet(ModelViewSet):
     queryset = Recipe.objects.select_related('author').prefetch_related(
         'tags',
-        'ingredients').all()
-    filter_backends = (DjangoFilterBackend,)
+        Prefetch('ingredientamount_set',
+                 queryset=IngredientAmount.objects.select_related(
+                     'ingredient').order_by('ingredient_id'))
+    ).defer('search_vector')
+    filter_backends = (DjangoFilterBackend, StableOrderingFilter)
     filterset_class = RecipeFilter
-    pagination_class = LimitPageNumberPagination
+    ordering_fields = ('pub_date', 'name', 'favorites_count',
+                       'in_carts_count')
+    pagination_class = RecipePagination
     http_method_names = ('get', 'post', 'patch', 'delete',)
     permission_classes = (IsAdminOrAuthorOrReadOnly,)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(Favorites.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        counters.change(User, instance.author_id, 'recipes_count', -1)
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeSerializer
         return RecipeCreateSerializer
 
+    def get_shared_queryset(self):
+        return self.queryset.annotate(is_favorited=Value(False),
+                                      is_in_shopping_cart=Value(False))
+
+    def serialize_shared(self, recipe):
+        if recipe.author is not None:
+            recipe.author.is_subscribed = False
+        return RecipeSerializer(recipe,
+                                context=self.get_serializer_context()).data
+
+    def get_shared_data(self, pk):
+        return self.serialize_shared(
+            get_object_or_404(self.get_shared_queryset(), pk=pk))
+
+    def retrieve(self, request, pk):
+        state = get_object_or_404(recipe_cache.recipe_state(request.user),
+                                  pk=pk)
+        data = recipe_cache.get_or_build(
+            recipe_cache.cache_key(request, pk, state['updated_at']),
+            lambda: self.get_shared_data(pk))
+        return Response(
+            recipe_cache.apply_user_fields(data, state, request.user))
+
     @staticmethod
     def create_object(serializer_class, pk, request):
-        create_data = {
-            'user': request.user.id,
-            'recipe': pk
-        }
+        create_data = {'recipe': pk}
         context = {'request': request}
         serializer = serializer_class(data=create_data, context=context)
         serializer.is_valid(raise_exception=True)
@@ -127,14 +239,59 @@ class RecipeViewSet(ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
+    @transaction.atomic
     def delete_object(model, pk, request):
-        obj = model.objects.filter(recipe_id=pk, user=request.user)
-        if not obj.exists():
+        deleted, _ = model.objects.filter(recipe_id=pk,
+                                          user=request.user).delete()
+        if not deleted:
             return Response({'detail': 'Рецепт не найден'},
                             status=status.HTTP_400_BAD_REQUEST)
-        obj.delete()
+        counters.change(Recipe, pk, counters.RECIPE_COUNTERS[model],
+                        -deleted)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    @transaction.atomic
+    def bulk_change(model, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        user_id = request.user.id
+        if request.method == 'POST':
+            recipes = set(Recipe.objects.filter(pk__in=ids)
+                          .values_list('pk', flat=True))
+            changed, results = bulk.add_links(
+                model, 'user_id', 'recipe_id', user_id, ids, recipes)
+            delta = 1
+        else:
+            changed, results = bulk.remove_links(
+                model, 'user_id', 'recipe_id', user_id, ids)
+            delta = -1
+        counters.change_many(Recipe, changed,
+                             counters.RECIPE_COUNTERS[model], delta)
+        if model is ShoppingCart and changed:
+            if delta > 0:
+                shopping_list.add_recipes(user_id, changed)
+            else:
+                shopping_list.remove_recipes(user_id, changed)
+        return Response({'results': results})
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,),
+            url_path='favorite',
+            url_name='favorite-bulk')
+    def favorite_bulk(self, request):
+        return self.bulk_change(Favorites, request)
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,),
+            url_path='shopping_cart',
+            url_name='shopping-cart-bulk')
+    def shopping_cart_bulk(self, request):
+        return self.bulk_change(ShoppingCart, request)
+
     @action(
         detail=True,
         methods=['post'],
@@ -153,33 +310,35 @@ class RecipeViewSet(ModelViewSet):
         return self.create_object(ShoppingCartSerializer, pk, request)
 
     @shopping_cart.mapping.delete
+    @transaction.atomic
     def delete_shopping_cart(self, request, pk):
-        return self.delete_object(ShoppingCart, pk, request)
-
-    @staticmethod
-    def send_message(ingredients):
-        shopping_list = ('Необходимые ингредиенты для покупки:\n')
-        for ingredient in ingredients:
-            shopping_list += '\n'.join([
-                f'{ingredient["ingredient__name"]} '
-                f'{ingredient["amount"]}'
-                f'{ingredient["ingredient__measurement_unit"]}\n'])
-        response = FileResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename=shopping_cart.txt')
+        response = self.delete_object(ShoppingCart, pk, request)
+        if response.status_code == status.HTTP_204_NO_CONTENT:
+            shopping_list.remove_recipes(request.user.id, [pk])
         return response
 
     @action(methods=['GET', ],
             detail=False,
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(TxtShoppingListRenderer,
+                              CsvShoppingListRenderer,
+                              PdfShoppingListRenderer),
+            content_negotiation_class=FirstRendererFallback)
     def download_shopping_cart(self, request):
         user = request.user
         if not user.shopping_cart.exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        ingredients = IngredientAmount.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
+        ingredients = user.shopping_list.values(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount')).order_by('ingredient__name')
-        return self.send_message(ingredients=ingredients)
+            'ingredient__measurement_unit',
+            'amount'
+        ).order_by('ingredient__name')
+        renderer = request.accepted_renderer
+        chunks = renderer.stream(ingredients.iterator())
+        if settings.ASGI_MODE:
+            chunks = async_chunks(chunks)
+        response = StreamingHttpResponse(chunks,
+                                         content_type=renderer.content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename=shopping_cart.{renderer.format}')
+        return response
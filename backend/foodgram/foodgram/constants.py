@@ -6,3 +6,12 @@ MAX_EMAIL_FIELD = 254
 MAX_USER_PARAMETRS = 150
 MAX_COLOR_FIELD = 7
 MAX_NAME = 200
+INGREDIENTS_SEARCH_LIMIT = 50
+MAX_TAGS = 63
+IMAGE_VARIANTS = {'image_small': 320, 'image_medium': 800}
+IMAGE_VARIANTS_QUALITY = 80
+RECIPE_CACHE_TIMEOUT = 600
+RECIPE_CACHE_LOCK_TIMEOUT = 10
+RECIPE_CACHE_LOCK_WAIT = 0.05
+MAX_PAGE_SIZE = 100
+BULK_MAX_SIZE = 100
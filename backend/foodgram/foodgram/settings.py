@@ -36,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,6 +67,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_MODE = os.getenv('ASGI_MODE') == 'True'
+
 if os.getenv('SQLITE') == 'False':
     DATABASES = {
         'default': {
@@ -73,7 +77,17 @@ if os.getenv('SQLITE') == 'False':
             'USER': os.getenv('POSTGRES_USER', 'foodgram'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
             'HOST': os.getenv('DB_HOST', 'db'),
-            'PORT': os.getenv('DB_PORT', 5432)
+            'PORT': os.getenv('DB_PORT', 5432),
+            # Под ASGI поток запроса завершается вместе с запросом, и его
+            # постоянное соединение некому переиспользовать: соединения
+            # держит PgBouncer. Синхронный воркер держит одно соединение.
+            'CONN_MAX_AGE': (0 if ASGI_MODE
+                             else int(os.getenv('CONN_MAX_AGE', 60))),
+            'CONN_HEALTH_CHECKS': True,
+            # PgBouncer в режиме transaction не сохраняет серверные
+            # курсоры между транзакциями.
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.getenv('DB_TRANSACTION_POOLING') == 'True'),
         }
     }
 else:
@@ -84,6 +98,27 @@ else:
         }
     }
 
+# Одиночное построение карточки рецепта (api/recipe_cache.py) требует
+# атомарного cache.add: Redis, Memcached или кеша в базе. С файловым
+# кешем по умолчанию при промахе каждый воркер строит карточку сам.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+    }
+}
+
+COUNT_CACHE_TIMEOUT = int(os.getenv('COUNT_CACHE_TIMEOUT', 30))
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv('COUNT_ESTIMATE_THRESHOLD', 10000))
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 0))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', '/tmp/foodgram_slow_queries.log')
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0.1))
+SLOW_QUERY_EXPLAIN_INTERVAL = int(
+    os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', 60))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,16 @@
+"""Воркер uvicorn для gunicorn с ограничением одновременных запросов.
+
+Под ASGI каждый запрос работает с базой в своём потоке и своём
+соединении, поэтому сверх ASGI_CONCURRENCY запросов воркер отвечает 503,
+а не открывает новые соединения.
+"""
+import os
+
+from uvicorn.workers import UvicornWorker
+
+
+class BoundedUvicornWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        'limit_concurrency': int(os.getenv('ASGI_CONCURRENCY', 50)),
+    }
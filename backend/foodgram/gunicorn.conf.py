@@ -0,0 +1,36 @@
+"""Настройки gunicorn: режим воркеров и общий каталог метрик.
+
+При ASGI_MODE=True воркеры uvicorn запускают foodgram.asgi, и чтение
+тегов, ингредиентов и рецептов идёт через асинхронные view; иначе —
+синхронные воркеры с foodgram.wsgi. Число соединений с базой в обоих
+режимах ограничивает PgBouncer: воркеров × ASGI_CONCURRENCY не должно
+быть больше его MAX_CLIENT_CONN.
+"""
+import multiprocessing
+import os
+import shutil
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/foodgram_metrics')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+if os.getenv('ASGI_MODE') == 'True':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'foodgram.workers.BoundedUvicornWorker'
+    workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+    workers = int(os.getenv('GUNICORN_WORKERS',
+                            multiprocessing.cpu_count() * 2 + 1))
+
+
+def on_starting(server):
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
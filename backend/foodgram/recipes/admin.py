@@ -12,25 +12,29 @@ from recipes.models import (
 class IngredientInline(admin.TabularInline):
     model = IngredientAmount
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug', 'color',)
     list_filter = ('name', )
+    search_fields = ('name', 'slug')
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('author', 'name', 'cooking_time',
-                    'get_favorites', 'get_ingredients',)
-    search_fields = ('name', 'author', 'tags',)
-    list_filter = ('author', 'name', 'tags',)
+                    'favorites_count', 'in_carts_count', 'get_ingredients',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username',)
+    list_filter = ('tags', ('pub_date', admin.DateFieldListFilter),)
+    autocomplete_fields = ('author', 'tags',)
+    show_full_result_count = False
     inlines = (IngredientInline,)
 
-    def get_favorites(self, obj):
-        return obj.favorites.count()
-    get_favorites.short_description = 'Избранное'
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('ingredients')
 
     def get_ingredients(self, obj):
         return ', '.join([
@@ -42,19 +46,24 @@ class RecipeAdmin(admin.ModelAdmin):
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit',)
-    search_fields = ('name', )
-    list_filter = ('name', )
+    search_fields = ('^name', )
+    list_filter = ('measurement_unit', )
+    show_full_result_count = False
 
 
 @admin.register(Favorites)
 class FavoritesAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
-    list_filter = ('user', 'recipe')
-    search_fields = ('user', 'recipe')
+    list_select_related = ('user', 'recipe__author')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'user',)
-    list_filter = ('recipe', 'user',)
-    search_fields = ('user', )
+    list_select_related = ('user', 'recipe__author')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
@@ -0,0 +1,155 @@
+"""Копии небольших справочников в памяти процесса.
+
+Каждый воркер держит свою копию данных и сверяет её с номером версии
+в общем кеше Django. Сигналы моделей меняют версию, после чего все
+воркеры перестраивают копию при следующем обращении. Асинхронные view
+получают копию через adata(), методы чтения принимают её аргументом.
+"""
+import logging
+import threading
+from bisect import bisect_left
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from recipes.models import Ingredient, Tag
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogCache:
+    def __init__(self, name):
+        self.version_key = f'catalog:{name}:version'
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = None
+
+    def queryset(self):
+        raise NotImplementedError
+
+    def index(self, rows):
+        raise NotImplementedError
+
+    def build(self):
+        return self.index(list(self.queryset()))
+
+    def stamp(self):
+        stamp = cache.get(self.version_key)
+        if stamp is None:
+            stamp = (uuid4().hex, timezone.now())
+            if not cache.add(self.version_key, stamp, None):
+                stamp = cache.get(self.version_key, stamp)
+        return stamp
+
+    @property
+    def data(self):
+        version, _ = self.stamp()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._data = self.build()
+                    self._version = version
+        return self._data
+
+    async def astamp(self):
+        stamp = await cache.aget(self.version_key)
+        if stamp is None:
+            stamp = (uuid4().hex, timezone.now())
+            if not await cache.aadd(self.version_key, stamp, None):
+                stamp = await cache.aget(self.version_key, stamp)
+        return stamp
+
+    async def adata(self):
+        version, _ = await self.astamp()
+        if self._version != version:
+            # Без блокировки: два параллельных запроса в худшем случае
+            # построят копию дважды. Версия ставится после данных, чтобы
+            # синхронное чтение не получило новую версию со старой копией.
+            self._data = self.index(
+                [row async for row in self.queryset()])
+            self._version = version
+        return self._data
+
+    def bump(self):
+        cache.set(self.version_key, (uuid4().hex, timezone.now()), None)
+
+    def invalidate(self):
+        self.bump()
+        transaction.on_commit(self.bump)
+
+
+class IngredientIndex(CatalogCache):
+    """Отсортированный по имени список ингредиентов для поиска по префиксу."""
+
+    def queryset(self):
+        return Ingredient.objects.values('id', 'name', 'measurement_unit')
+
+    def index(self, rows):
+        rows = sorted(
+            rows, key=lambda row: (row['name'].casefold(), row['id']))
+        return (
+            [row['name'].casefold() for row in rows],
+            rows,
+            {row['id']: row for row in rows},
+        )
+
+    def all(self, data=None):
+        return (data or self.data)[1]
+
+    def get(self, pk, data=None):
+        return (data or self.data)[2].get(pk)
+
+    def search(self, prefix, limit=None, data=None):
+        keys, rows, _ = data or self.data
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + chr(0x10FFFF), lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return rows[start:end]
+
+
+class TagCatalog(CatalogCache):
+    def queryset(self):
+        return Tag.objects.order_by('id').values(
+            'id', 'name', 'color', 'slug', 'bit')
+
+    def index(self, rows):
+        masks = {row['slug']: 1 << row.pop('bit') for row in rows}
+        return rows, {row['id']: row for row in rows}, masks
+
+    def all(self, data=None):
+        return (data or self.data)[0]
+
+    def get(self, pk, data=None):
+        return (data or self.data)[1].get(pk)
+
+    def mask(self, slugs):
+        masks = self.data[2]
+        mask = 0
+        for slug in slugs:
+            mask |= masks.get(slug, 0)
+        return mask
+
+    def choices(self):
+        return [(row['slug'], row['name']) for row in self.all()]
+
+    def etag(self, request, *args, **kwargs):
+        return self.stamp()[0]
+
+    def last_modified(self, request, *args, **kwargs):
+        return self.stamp()[1]
+
+
+ingredient_index = IngredientIndex('ingredients')
+tag_catalog = TagCatalog('tags')
+
+
+def warm_caches():
+    try:
+        ingredient_index.data
+        tag_catalog.data
+    except DatabaseError:
+        logger.warning('Справочники не загружены при старте.', exc_info=True)
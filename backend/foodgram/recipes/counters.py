@@ -0,0 +1,72 @@
+"""Денормализованные счётчики рецептов и пользователей.
+
+Счётчики меняются F-выражениями в той же транзакции, что и связанные
+записи. Изменения в обход API (админка, каскадное удаление) приводят к
+расхождениям, которые исправляет команда reconcile_counters.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from recipes.models import Favorites, Recipe, ShoppingCart
+from users.models import User
+
+COUNTERS = {
+    Recipe: {
+        'favorites_count': 'favorites',
+        'in_carts_count': 'shopping_cart',
+    },
+    User: {
+        'recipes_count': 'recipes',
+        'followers_count': 'recipeauthor',
+    },
+}
+
+RECIPE_COUNTERS = {
+    Favorites: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+def change(model, pk, field, delta):
+    change_many(model, [pk], field, delta)
+
+
+def change_many(model, pks, field, delta):
+    if delta and pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, 0)})
+
+
+def actual_counts(model, ids):
+    counts = {pk: dict.fromkeys(COUNTERS[model], 0) for pk in ids}
+    for field, related_name in COUNTERS[model].items():
+        relation = model._meta.get_field(related_name)
+        column = relation.field.attname
+        for pk, total in (
+            relation.related_model.objects
+            .filter(**{f'{column}__in': ids})
+            .values_list(column)
+            .annotate(total=Count('pk'))
+            .order_by()
+        ):
+            counts[pk][field] = total
+    return counts
+
+
+@transaction.atomic
+def repair(model, ids):
+    """Пересчитывает счётчики объектов и возвращает число исправленных."""
+    fields = tuple(COUNTERS[model])
+    objects = list(model.objects.select_for_update()
+                   .filter(pk__in=ids).order_by('pk').only('pk', *fields))
+    counts = actual_counts(model, [obj.pk for obj in objects])
+    drifted = []
+    for obj in objects:
+        actual = counts[obj.pk]
+        if any(getattr(obj, field) != actual[field] for field in fields):
+            for field in fields:
+                setattr(obj, field, actual[field])
+            drifted.append(obj)
+    model.objects.bulk_update(drifted, fields)
+    return len(drifted)
@@ -0,0 +1,97 @@
+"""Уменьшенные WebP-копии картинок рецептов.
+
+Копии строятся после коммита транзакции в отдельном потоке, поэтому
+запрос на сохранение рецепта их не ждёт. Пока копии нет, сериализаторы
+отдают оригинал. Имя копии строится из имени оригинала, так что копии
+старой картинки сразу перестают считаться готовыми.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from foodgram.constants import IMAGE_VARIANTS, IMAGE_VARIANTS_QUALITY
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_VARIANTS_WORKERS', 1),
+    thread_name_prefix='image-variants')
+
+
+def variant_prefix(image_name, field_name):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'recipes/variants/{stem}_{field_name}'
+
+
+def variant_ready(recipe, field_name):
+    variant = getattr(recipe, field_name)
+    return bool(recipe.image and variant and variant.name.startswith(
+        variant_prefix(recipe.image.name, field_name)))
+
+
+def variants_ready(recipe):
+    return all(variant_ready(recipe, field_name)
+               for field_name in IMAGE_VARIANTS)
+
+
+def render_variant(original, size):
+    image = original.copy()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    image.thumbnail((size, size))
+    buffer = BytesIO()
+    image.save(buffer, 'WEBP', quality=IMAGE_VARIANTS_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_variants(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image or variants_ready(recipe):
+        return
+    try:
+        with recipe.image.open('rb') as file, Image.open(file) as original:
+            original.load()
+            variants = {
+                field_name: render_variant(original, size)
+                for field_name, size in IMAGE_VARIANTS.items()
+            }
+    except (OSError, UnidentifiedImageError):
+        logger.exception('Не удалось обработать картинку рецепта %s',
+                         recipe_id)
+        return
+    storage = recipe.image.storage
+    names = {}
+    for field_name, content in variants.items():
+        old_variant = getattr(recipe, field_name)
+        names[field_name] = storage.save(
+            f'{variant_prefix(recipe.image.name, field_name)}.webp', content)
+        if old_variant:
+            old_variant.delete(save=False)
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(updated_at=timezone.now(), **names)
+    if not updated:
+        for name in names.values():
+            storage.delete(name)
+
+
+def run_in_background(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(recipe):
+    if recipe.image and not variants_ready(recipe):
+        recipe_id = recipe.pk
+        transaction.on_commit(
+            lambda: executor.submit(run_in_background, recipe_id))
@@ -0,0 +1,58 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from django.db.models.functions import Upper
+
+from foodgram.constants import INGREDIENTS_SEARCH_LIMIT
+from recipes.caches import ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Сравнение поиска ингредиентов по префиксу: фильтр в БД '
+            'и индекс в памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Количество повторов каждого запроса')
+        parser.add_argument('--prefix-length', type=int, nargs='+',
+                            default=(1, 2, 3, 5),
+                            help='Длины префиксов для проверки')
+
+    @staticmethod
+    def measure(search, prefixes, repeat):
+        start = perf_counter()
+        for _ in range(repeat):
+            for prefix in prefixes:
+                search(prefix)
+        return (perf_counter() - start) / (repeat * len(prefixes))
+
+    @staticmethod
+    def search_db(prefix):
+        # Те же первые INGREDIENTS_SEARCH_LIMIT строк, что отдаёт индекс,
+        # иначе БД измеряется на всех совпадениях и разница завышена.
+        return list(Ingredient.objects.filter(name__istartswith=prefix)
+                    .order_by(Upper('name'), 'id')
+                    .values('id', 'name', 'measurement_unit')
+                    [:INGREDIENTS_SEARCH_LIMIT])
+
+    @staticmethod
+    def search_index(prefix):
+        return ingredient_index.search(prefix, INGREDIENTS_SEARCH_LIMIT)
+
+    def handle(self, *args, **options):
+        names = [row['name'] for row in ingredient_index.all()]
+        if not names:
+            self.stdout.write('Справочник ингредиентов пуст.')
+            return
+        step = max(len(names) // 50, 1)
+        for length in options['prefix_length']:
+            prefixes = sorted({name[:length] for name in names[::step]})
+            db_time = self.measure(self.search_db, prefixes,
+                                   options['repeat'])
+            index_time = self.measure(self.search_index, prefixes,
+                                      options['repeat'])
+            self.stdout.write(
+                f'Префикс {length}: БД {db_time * 1e6:.0f} мкс, '
+                f'индекс {index_time * 1e6:.1f} мкс, '
+                f'быстрее в {db_time / index_time:.0f} раз')
@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipes import shopping_list
+from recipes.management.utils import user_id_chunks
+
+
+class Command(BaseCommand):
+    help = 'Проверка итогов списков покупок на соответствие корзинам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Количество пользователей в одной проверке')
+        parser.add_argument('--fix', action='store_true',
+                            help='Пересчитать расходящиеся списки')
+
+    def handle(self, *args, **options):
+        broken = []
+        for chunk in user_id_chunks(options['chunk_size']):
+            broken.extend(shopping_list.inconsistent_users(chunk))
+        if not broken:
+            self.stdout.write('Списки покупок согласованы.')
+            return
+        if options['fix']:
+            shopping_list.rebuild(broken)
+            self.stdout.write(f'Пересчитаны списки покупок пользователей: '
+                              f'{broken}')
+            return
+        raise CommandError(f'Списки покупок расходятся с корзинами у '
+                           f'пользователей: {broken}')
@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from recipes.images import generate_variants, variants_ready
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий картинок рецептов, которых ещё нет.'
+
+    def handle(self, *args, **options):
+        generated = 0
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_small', 'image_medium')
+        for recipe in recipes.iterator():
+            if not variants_ready(recipe):
+                generate_variants(recipe.id)
+                generated += 1
+        self.stdout.write(f'Обработано рецептов: {generated}.')
@@ -1,30 +1,17 @@
-
-import csv
-
-from django.core.management import BaseCommand
-
+from recipes.caches import ingredient_index
+from recipes.management.loaders import BaseLoadCommand
 from recipes.models import Ingredient
 
 
-class Command(BaseCommand):
-    help = 'Заполнение данных в модель Ingredient из csv.'
+class Command(BaseLoadCommand):
+    help = 'Заполнение данных в модель Ingredient из csv или json.'
+    default_path = 'data/ingredients.csv'
+    fields = ('name', 'measurement_unit')
 
-    def add_arguments(self, parser):
-        parser.add_argument('--path', type=str, help='Путь к файлу')
+    def save_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            (Ingredient(**row) for row in batch),
+            ignore_conflicts=True)
 
-    def handle(self, *args, **options):
-        try:
-            file_path = 'data/ingredients.csv'
-            with open(file_path, 'r', encoding='utf-8') as csv_file:
-                reader = csv.reader(csv_file)
-                self.stdout.write('Заполнение началось')
-                for name, measurement_unit in reader:
-                    Ingredient.objects.create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
-            self.stdout.write('Заполнение завершено.')
-        except FileNotFoundError as e:
-            self.stdout.write(f'Ошибка: {e}')
-        except Exception as e:
-            self.stdout.write(f'Ошибка: {e}')
+    def after_load(self):
+        ingredient_index.invalidate()
@@ -1,31 +1,73 @@
+from django.db.models import Q
 
-import csv
+from recipes.caches import tag_catalog
+from recipes.management.loaders import BaseLoadCommand
+from recipes.models import Tag
 
-from django.core.management import BaseCommand
 
-from recipes.models import Tag
+class Command(BaseLoadCommand):
+    help = ('Заполнение данных в модель Tag из csv или json. Теги '
+            'сопоставляются по slug; строка, название или цвет которой уже '
+            'занят другим тегом, пропускается с сообщением.')
+    default_path = 'data/tags.csv'
+    fields = ('name', 'color', 'slug')
+    unique_fields = ('name', 'color')
+
+    def before_load(self):
+        # (поле, значение) -> slug тега, которому значение принадлежит.
+        self.owners = {}
+        self.loaded = set()
+        self.skipped = 0
+
+    def conflict(self, row):
+        if row['slug'] in self.loaded:
+            return f'slug {row["slug"]} повторяется в файле'
+        return ', '.join(
+            f'{field} {row[field]} занят тегом {owner}'
+            for field in self.unique_fields
+            for owner in [self.owners.get((field, row[field]), row['slug'])]
+            if owner != row['slug']
+        )
+
+    def valid_rows(self, batch):
+        """Строки пачки, которые не нарушат уникальность name и color.
+
+        Значение занято, если оно есть в базе у тега с другим slug или у
+        принятой ранее строки файла.
+        """
+        for tag in Tag.objects.filter(
+                Q(name__in=[row['name'] for row in batch])
+                | Q(color__in=[row['color'] for row in batch])
+        ).values('slug', *self.unique_fields):
+            for field in self.unique_fields:
+                self.owners.setdefault((field, tag[field]), tag['slug'])
+        for row in batch:
+            conflict = self.conflict(row)
+            if conflict:
+                self.skipped += 1
+                self.stderr.write(f'Тег {row["slug"]} пропущен: {conflict}.')
+                continue
+            self.loaded.add(row['slug'])
+            for field in self.unique_fields:
+                self.owners[field, row[field]] = row['slug']
+            yield row
 
+    def save_batch(self, batch):
+        batch = list(self.valid_rows(batch))
+        bits = dict(Tag.objects.filter(
+            slug__in=[row['slug'] for row in batch]
+        ).values_list('slug', 'bit'))
+        new_rows = [row for row in batch if row['slug'] not in bits]
+        bits.update(zip((row['slug'] for row in new_rows),
+                        Tag.free_bits(len(new_rows))))
+        Tag.objects.bulk_create(
+            (Tag(bit=bits[row['slug']], **row) for row in batch),
+            update_conflicts=True,
+            unique_fields=('slug',),
+            update_fields=self.unique_fields)
 
-class Command(BaseCommand):
-    help = 'Заполнение данных в модель Tag из csv.'
-
-    def add_arguments(self, parser):
-        parser.add_argument('--path', type=str, help='Путь к файлу')
-
-    def handle(self, *args, **options):
-        file_path = 'data/tags.csv'
-        try:
-            with open(file_path, 'r', encoding='utf-8') as csv_file:
-                reader = csv.reader(csv_file)
-                self.stdout.write('Заполнение началось')
-                for name, color, slug in reader:
-                    Tag.objects.create(
-                        name=name,
-                        color=color,
-                        slug=slug
-                    )
-                self.stdout.write('Заполнение завершено.')
-        except FileNotFoundError as e:
-            self.stdout.write(f'Ошибка: {e}')
-        except Exception as e:
-            self.stdout.write(f'Ошибка: {e}')
+    def after_load(self):
+        if self.skipped:
+            self.stderr.write(
+                f'Пропущено строк с конфликтами: {self.skipped}.')
+        tag_catalog.invalidate()
@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.management.utils import id_chunks
+from recipes.models import Recipe
+from recipes.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестроение полнотекстового индекса рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Количество рецептов в одной транзакции')
+
+    def handle(self, *args, **options):
+        recipes = 0
+        for chunk in id_chunks(Recipe, options['chunk_size']):
+            with transaction.atomic():
+                update_search_index(chunk)
+            recipes += len(chunk)
+        self.stdout.write(f'Переиндексировано рецептов: {recipes}.')
@@ -0,0 +1,20 @@
+from django.core.management import BaseCommand
+
+from recipes import shopping_list
+from recipes.management.utils import user_id_chunks
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт итогов списков покупок из корзин пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Количество пользователей в одной транзакции')
+
+    def handle(self, *args, **options):
+        users = 0
+        for chunk in user_id_chunks(options['chunk_size']):
+            shopping_list.rebuild(chunk)
+            users += len(chunk)
+        self.stdout.write(f'Пересчитаны списки покупок: {users} '
+                          f'пользователей.')
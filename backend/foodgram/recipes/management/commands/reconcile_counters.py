@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+
+from recipes import counters
+from recipes.management.utils import id_chunks
+
+
+class Command(BaseCommand):
+    help = 'Исправление расхождений в счётчиках рецептов и пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Количество объектов в одной транзакции')
+
+    def handle(self, *args, **options):
+        for model in counters.COUNTERS:
+            fixed = checked = 0
+            for chunk in id_chunks(model, options['chunk_size']):
+                fixed += counters.repair(model, chunk)
+                checked += len(chunk)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: проверено {checked}, '
+                f'исправлено {fixed}.')
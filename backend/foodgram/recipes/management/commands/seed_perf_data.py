@@ -0,0 +1,273 @@
+import csv
+import random
+from collections import Counter, defaultdict
+from datetime import timedelta
+from io import StringIO
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.models import (Favorites, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.search import update_search_index
+from users.models import Follow, User
+
+AMOUNTS = (1, 2, 3, 5, 10, 20, 50, 100, 150, 200, 250, 300, 400, 500)
+PASSWORD = 'perf-password'
+
+
+def insert_rows(model, objects, chunk_size):
+    """Вставляет объекты как есть: без pre_save, сигналов и валидации.
+
+    На PostgreSQL строки передаются через COPY, на остальных базах —
+    одним executemany на пачку.
+    """
+    fields = model._meta.concrete_fields
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column)
+                        for field in fields)
+    objects = iter(objects)
+    with connection.cursor() as cursor:
+        while chunk := list(islice(objects, chunk_size)):
+            rows = [
+                [field.get_db_prep_save(getattr(obj, field.attname),
+                                        connection) for field in fields]
+                for obj in chunk
+            ]
+            if connection.vendor == 'postgresql':
+                buffer = StringIO()
+                writer = csv.writer(buffer)
+                for row in rows:
+                    writer.writerow(
+                        [r'\N' if value is None else value for value in row])
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {table} ({columns}) FROM STDIN "
+                    f"WITH (FORMAT csv, NULL '\\N')", buffer)
+            else:
+                placeholders = ', '.join(['%s'] * len(fields))
+                cursor.executemany(
+                    f'INSERT INTO {table} ({columns}) '
+                    f'VALUES ({placeholders})', rows)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Popularity:
+    """Выбор элементов с частотами по закону Ципфа."""
+
+    def __init__(self, rng, items, exponent=1.0):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)))
+
+    def pick(self):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+    def sample(self, count, exclude=None):
+        count = min(count, len(self.items) - (exclude is not None))
+        if count * 2 > len(self.items):
+            sample = self.rng.sample(self.items,
+                                     min(count + 1, len(self.items)))
+            return [item for item in sample if item != exclude][:count]
+        picked = {}
+        while len(picked) < count:
+            item = self.pick()
+            if item != exclude:
+                picked[item] = None
+        return list(picked)
+
+
+class Command(BaseCommand):
+    help = ('Генерация большого набора пользователей, рецептов, избранного, '
+            'корзин и подписок для замеров производительности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Количество пользователей')
+        parser.add_argument('--recipes', type=int, default=5000,
+                            help='Количество рецептов')
+        parser.add_argument('--favorites', type=float, default=10,
+                            help='Среднее число избранных у пользователя')
+        parser.add_argument('--carts', type=float, default=3,
+                            help='Среднее число рецептов в корзине')
+        parser.add_argument('--follows', type=float, default=5,
+                            help='Среднее число подписок у пользователя')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора случайных чисел')
+        parser.add_argument('--prefix', default='perf',
+                            help='Префикс имён пользователей')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Количество строк в одной вставке')
+
+    @staticmethod
+    def count(rng, mean, limit):
+        return min(int(rng.expovariate(1 / mean)) if mean > 0 else 0, limit)
+
+    @staticmethod
+    def recipe_name(recipe_id, recipe_amounts, ingredient_names):
+        main, *rest = recipe_amounts[recipe_id]
+        name = ingredient_names[main].capitalize()
+        if rest:
+            name += f' и {ingredient_names[rest[0]]}'
+        return f'{name} №{recipe_id}'
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и 1 рецепт.')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть.')
+        ingredient_names = dict(Ingredient.objects.order_by('pk')
+                                .values_list('pk', 'name'))
+        tag_bits = dict(Tag.objects.order_by('pk').values_list('pk', 'bit'))
+        if not ingredient_names or not tag_bits:
+            raise CommandError('Сначала загрузите ингредиенты и теги: '
+                               'load_ingredients и load_tags.')
+        with transaction.atomic():
+            recipe_ids, totals = self.seed(
+                random.Random(options['seed']), options, ingredient_names,
+                tag_bits)
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    for sql in connection.ops.sequence_reset_sql(
+                            no_style(),
+                            (User, Recipe, Recipe.tags.through,
+                             IngredientAmount, Favorites, ShoppingCart,
+                             Follow, ShoppingListItem)):
+                        cursor.execute(sql)
+            for start in range(recipe_ids.start, recipe_ids.stop,
+                               options['chunk_size']):
+                update_search_index(range(
+                    start, min(start + options['chunk_size'],
+                               recipe_ids.stop)))
+        self.stdout.write(', '.join(
+            f'{name}: {count}' for name, count in totals.items()))
+
+    def seed(self, rng, options, ingredient_names, tag_bits):
+        chunk_size = options['chunk_size']
+        now = timezone.now()
+        first_user, first_recipe = next_id(User), next_id(Recipe)
+        user_ids = range(first_user, first_user + options['users'])
+        recipe_ids = range(first_recipe, first_recipe + options['recipes'])
+        authors = Popularity(rng, user_ids, exponent=1.1)
+        ingredients = Popularity(rng, ingredient_names)
+        recipes_popularity = Popularity(rng, recipe_ids, exponent=0.9)
+        recipes_count, followers_count = Counter(), Counter()
+        favorites_count, in_carts_count = Counter(), Counter()
+
+        recipe_authors = {}
+        recipe_tags = {}
+        recipe_amounts = {}
+        for recipe_id in recipe_ids:
+            recipe_authors[recipe_id] = authors.pick()
+            recipes_count[recipe_authors[recipe_id]] += 1
+            recipe_tags[recipe_id] = rng.sample(
+                list(tag_bits), rng.randint(1, min(3, len(tag_bits))))
+            size = min(max(int(rng.gauss(8, 3)), 1), len(ingredient_names))
+            recipe_amounts[recipe_id] = {
+                ingredient_id: rng.choice(AMOUNTS)
+                for ingredient_id in ingredients.sample(size)
+            }
+
+        favorites, carts, follows = [], [], []
+        shopping_lists = defaultdict(Counter)
+        for user_id in user_ids:
+            for recipe_id in recipes_popularity.sample(
+                    self.count(rng, options['favorites'], len(recipe_ids))):
+                favorites.append((user_id, recipe_id))
+                favorites_count[recipe_id] += 1
+            for recipe_id in recipes_popularity.sample(
+                    self.count(rng, options['carts'], len(recipe_ids))):
+                carts.append((user_id, recipe_id))
+                in_carts_count[recipe_id] += 1
+                shopping_lists[user_id].update(recipe_amounts[recipe_id])
+            for author_id in authors.sample(
+                    self.count(rng, options['follows'], len(user_ids) - 1),
+                    exclude=user_id):
+                follows.append((user_id, author_id))
+                followers_count[author_id] += 1
+
+        password = make_password(PASSWORD)
+        insert_rows(User, (
+            User(id=user_id, username=f"{options['prefix']}_{user_id}",
+                 email=f"{options['prefix']}_{user_id}@example.com",
+                 first_name='Имя', last_name='Фамилия', password=password,
+                 is_active=True, date_joined=now,
+                 recipes_count=recipes_count[user_id],
+                 followers_count=followers_count[user_id])
+            for user_id in user_ids
+        ), chunk_size)
+        insert_rows(Recipe, (
+            Recipe(id=recipe_id, author_id=recipe_authors[recipe_id],
+                   name=self.recipe_name(recipe_id, recipe_amounts,
+                                         ingredient_names),
+                   text='Смешать: ' + ', '.join(
+                       ingredient_names[ingredient_id]
+                       for ingredient_id in recipe_amounts[recipe_id]),
+                   cooking_time=rng.randint(5, 180),
+                   image='recipes/perf.png',
+                   pub_date=now - timedelta(
+                       seconds=rng.randint(0, 365 * 24 * 3600)),
+                   updated_at=now,
+                   tags_mask=sum(1 << tag_bits[tag_id]
+                                 for tag_id in recipe_tags[recipe_id]),
+                   favorites_count=favorites_count[recipe_id],
+                   in_carts_count=in_carts_count[recipe_id])
+            for recipe_id in recipe_ids
+        ), chunk_size)
+        RecipeTag = Recipe.tags.through
+        insert_rows(RecipeTag, (
+            RecipeTag(id=pk, recipe_id=recipe_id, tag_id=tag_id)
+            for pk, (recipe_id, tag_id) in enumerate(
+                ((recipe_id, tag_id) for recipe_id, tags in recipe_tags.items()
+                 for tag_id in tags), start=next_id(RecipeTag))
+        ), chunk_size)
+        insert_rows(IngredientAmount, (
+            IngredientAmount(id=pk, recipe_id=recipe_id,
+                             ingredient_id=ingredient_id, amount=amount)
+            for pk, (recipe_id, ingredient_id, amount) in enumerate(
+                ((recipe_id, ingredient_id, amount)
+                 for recipe_id, amounts in recipe_amounts.items()
+                 for ingredient_id, amount in amounts.items()),
+                start=next_id(IngredientAmount))
+        ), chunk_size)
+        for model, pairs in ((Favorites, favorites), (ShoppingCart, carts)):
+            insert_rows(model, (
+                model(id=pk, user_id=user_id, recipe_id=recipe_id)
+                for pk, (user_id, recipe_id) in enumerate(
+                    pairs, start=next_id(model))
+            ), chunk_size)
+        insert_rows(Follow, (
+            Follow(id=pk, follower_id=follower_id, recipe_author_id=author_id)
+            for pk, (follower_id, author_id) in enumerate(
+                follows, start=next_id(Follow))
+        ), chunk_size)
+        insert_rows(ShoppingListItem, (
+            ShoppingListItem(id=pk, user_id=user_id,
+                             ingredient_id=ingredient_id, amount=amount)
+            for pk, (user_id, ingredient_id, amount) in enumerate(
+                ((user_id, ingredient_id, amount)
+                 for user_id, totals in shopping_lists.items()
+                 for ingredient_id, amount in totals.items()),
+                start=next_id(ShoppingListItem))
+        ), chunk_size)
+        return recipe_ids, {
+            'пользователей': len(user_ids),
+            'рецептов': len(recipe_ids),
+            'ингредиентов в рецептах': sum(
+                len(amounts) for amounts in recipe_amounts.values()),
+            'избранных': len(favorites),
+            'в корзинах': len(carts),
+            'подписок': len(follows),
+        }
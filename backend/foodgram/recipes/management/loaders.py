@@ -0,0 +1,77 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+
+class BaseLoadCommand(BaseCommand):
+    """Загрузка справочника из csv или json пачками в одной транзакции."""
+
+    default_path = None
+    fields = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', type=str, default=self.default_path,
+                            help='Путь к файлу csv или json')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество строк в одном запросе')
+
+    def read_csv(self, file):
+        for line, row in enumerate(csv.reader(file), start=1):
+            if len(row) != len(self.fields):
+                raise CommandError(
+                    f'Строка {line}: ожидается {len(self.fields)} '
+                    f'значения, получено {len(row)}.')
+            yield dict(zip(self.fields, row))
+
+    def read_json(self, file):
+        for line, row in enumerate(json.load(file), start=1):
+            try:
+                yield {field: row[field] for field in self.fields}
+            except (KeyError, TypeError):
+                raise CommandError(
+                    f'Запись {line}: ожидаются поля {self.fields}.')
+
+    def read_rows(self, path):
+        reader = self.read_json if path.suffix == '.json' else self.read_csv
+        with open(path, encoding='utf-8') as file:
+            yield from reader(file)
+
+    @staticmethod
+    def batches(rows, batch_size):
+        while batch := list(islice(rows, batch_size)):
+            yield batch
+
+    def save_batch(self, batch):
+        raise NotImplementedError
+
+    def before_load(self):
+        pass
+
+    def after_load(self):
+        pass
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        self.stdout.write('Заполнение началось')
+        start = perf_counter()
+        total = 0
+        with transaction.atomic():
+            self.before_load()
+            for batch in self.batches(self.read_rows(path),
+                                      options['batch_size']):
+                self.save_batch(batch)
+                total += len(batch)
+            self.after_load()
+        elapsed = perf_counter() - start
+        self.stdout.write(
+            f'Заполнение завершено: {total} строк за {elapsed:.2f} с '
+            f'({total / elapsed if elapsed else total:.0f} строк/с).')
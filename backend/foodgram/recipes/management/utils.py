@@ -0,0 +1,17 @@
+from users.models import User
+
+
+def id_chunks(model, chunk_size):
+    """Первичные ключи модели по возрастанию, списками до chunk_size."""
+    last_id = 0
+    while True:
+        chunk = list(model.objects.filter(pk__gt=last_id).order_by('pk')
+                     .values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+def user_id_chunks(chunk_size):
+    return id_chunks(User, chunk_size)
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def related_count(model, column):
+    return Coalesce(models.Subquery(
+        model.objects.filter(**{column: models.OuterRef('pk')})
+        .order_by().values(column)
+        .annotate(total=models.Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(
+        favorites_count=related_count(
+            apps.get_model('recipes', 'Favorites'), 'recipe'),
+        in_carts_count=related_count(
+            apps.get_model('recipes', 'ShoppingCart'), 'recipe'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+FTS_TABLE = 'recipes_recipe_fts'
+
+POSTGRES_FORWARD = (
+    "CREATE INDEX recipe_search_idx ON recipes_recipe "
+    "USING gin (search_vector)",
+    "UPDATE recipes_recipe AS recipe SET search_vector = "
+    "setweight(to_tsvector('russian', recipe.name), 'A') || "
+    "setweight(to_tsvector('russian', recipe.text), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(ingredient.name, ' ') "
+    "FROM recipes_ingredientamount AS amount "
+    "JOIN recipes_ingredient AS ingredient "
+    "ON ingredient.id = amount.ingredient_id "
+    "WHERE amount.recipe_id = recipe.id), '')), 'C')",
+)
+POSTGRES_BACKWARD = ('DROP INDEX IF EXISTS recipe_search_idx',)
+
+SQLITE_FORWARD = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "name, text, ingredients, tokenize='unicode61')",
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) "
+    "VALUES ('rank', 'bm25(10.0, 4.0, 1.0)')",
+    f"INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) "
+    "SELECT recipe.id, recipe.name, recipe.text, coalesce(("
+    "SELECT group_concat(ingredient.name, ' ') "
+    "FROM recipes_ingredientamount AS amount "
+    "JOIN recipes_ingredient AS ingredient "
+    "ON ingredient.id = amount.ingredient_id "
+    "WHERE amount.recipe_id = recipe.id), '') "
+    "FROM recipes_recipe AS recipe",
+)
+SQLITE_BACKWARD = (f'DROP TABLE IF EXISTS {FTS_TABLE}',)
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Заполняется только на PostgreSQL', null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRES_FORWARD,
+                            'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRES_BACKWARD,
+                            'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
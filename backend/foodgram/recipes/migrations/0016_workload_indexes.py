@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Префиксный поиск по ингредиентам: istartswith в Django на PostgreSQL
+# сравнивает UPPER(name::text) через LIKE, на SQLite — name через LIKE
+# без учёта регистра. Индексы для вендоров разные, поэтому их нет в
+# состоянии моделей; наличие индекса проверяет команда check_indexes.
+# SQLite пересоздаёт таблицу при изменении полей и теряет индекс, так что
+# такую миграцию Ingredient нужно дополнить его созданием.
+PREFIX_INDEX = 'ingredient_name_prefix_idx'
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """RunSQL, который меняет только базу указанного вендора."""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, [self.vendor, *args], kwargs
+
+    def database_forwards(self, app_label, schema_editor, *args):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, *args)
+
+    def database_backwards(self, app_label, schema_editor, *args):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, *args)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0015_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', 'name'], name='recipe_author_feed_idx'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='ingredientamount',
+            name='unique_ingredient_in_recipe',
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientamount',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_ingredient_in_recipe'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата публикации'),
+        ),
+        migrations.AlterField(
+            model_name='favorites',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientamount',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ingredientamount_set', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recipes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglistitem',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        VendorRunSQL(
+            'postgresql',
+            sql=f'CREATE INDEX {PREFIX_INDEX} ON recipes_ingredient '
+                '(UPPER(name::text) text_pattern_ops)',
+            reverse_sql=f'DROP INDEX IF EXISTS {PREFIX_INDEX}',
+        ),
+        VendorRunSQL(
+            'sqlite',
+            sql=f'CREATE INDEX {PREFIX_INDEX} ON recipes_ingredient '
+                '(name COLLATE NOCASE)',
+            reverse_sql=f'DROP INDEX IF EXISTS {PREFIX_INDEX}',
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+# recipe_feed_idx покрывает tags_mask (INCLUDE) только на PostgreSQL:
+# SQLite INCLUDE не поддерживает, и с include= в модели Django выдавал
+# на нём предупреждение models.W040. Поэтому в состоянии моделей индекс
+# остаётся без INCLUDE, а в базе ничего не меняется: на PostgreSQL индекс
+# из 0011 уже покрывающий, на SQLite он создан без INCLUDE. Для новой
+# базы PostgreSQL индекс с INCLUDE тоже создаёт 0011.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_workload_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='recipe',
+                    name='recipe_feed_idx',
+                ),
+                migrations.AddIndex(
+                    model_name='recipe',
+                    index=models.Index(fields=['-pub_date', 'name'], name='recipe_feed_idx'),
+                ),
+            ],
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.core.validators import (MaxValueValidator,
                                     MinValueValidator)
@@ -10,6 +12,7 @@ from foodgram.constants import (MAX_NAME,
                                 MAX_AMOUNT,
                                 MAX_COLOR_FIELD,
                                 MAX_MEASUREMENTS_UNIT,
+                                MAX_TAGS,
                                 MIN_AMOUNT)
 
 
@@ -27,6 +30,11 @@ class Tag(models.Model):
         unique=True,
     )
     slug = models.SlugField('Слаг', unique=True)
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тегов',
+        unique=True,
+        editable=False,
+        validators=(MaxValueValidator(MAX_TAGS - 1),))
 
     class Meta:
         verbose_name = 'Тег'
@@ -35,6 +43,24 @@ class Tag(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def mask(self):
+        return 1 << self.bit
+
+    @staticmethod
+    def free_bits(count=1):
+        used = set(Tag.objects.values_list('bit', flat=True))
+        bits = [bit for bit in range(MAX_TAGS) if bit not in used][:count]
+        if len(bits) < count:
+            raise ValidationError(
+                f'Нельзя создать больше {MAX_TAGS} тегов.')
+        return bits
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit, = self.free_bits()
+        super().save(*args, **kwargs)
+
 
 class Ingredient(models.Model):
     name = models.CharField('Ингредиент', max_length=MAX_NAME)
@@ -60,6 +86,7 @@ class Recipe(models.Model):
     author = models.ForeignKey(User,
                                on_delete=models.SET_NULL,
                                null=True,
+                               db_index=False,
                                related_name='recipes',)
     tags = models.ManyToManyField(Tag, verbose_name='Список тегов',
                                   related_name='recipes')
@@ -80,13 +107,48 @@ class Recipe(models.Model):
     image = models.ImageField('Картинка',
                               upload_to='recipes/',
                               help_text='Выберите картинку')
+    image_small = models.ImageField('Маленькая картинка',
+                                    upload_to='recipes/variants/',
+                                    blank=True,
+                                    editable=False)
+    image_medium = models.ImageField('Средняя картинка',
+                                     upload_to='recipes/variants/',
+                                     blank=True,
+                                     editable=False)
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации',
-        auto_now_add=True,
-        db_index=True)
+        auto_now_add=True)
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True)
+    tags_mask = models.BigIntegerField(
+        'Маска тегов',
+        default=0,
+        editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False)
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+        help_text='Заполняется только на PostgreSQL')
 
     class Meta:
         ordering = ('-pub_date', 'name',)
+        indexes = (
+            # На PostgreSQL индекс ещё и покрывает tags_mask (INCLUDE),
+            # см. миграцию 0017: SQLite INCLUDE не поддерживает.
+            models.Index(fields=('-pub_date', 'name'),
+                         name='recipe_feed_idx'),
+            models.Index(fields=('author', '-pub_date', 'name'),
+                         name='recipe_author_feed_idx'),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -111,11 +173,12 @@ class IngredientAmount(models.Model):
         Recipe,
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
+        db_index=False,
         related_name='ingredientamount_set')
 
     class Meta:
         constraints = (
-            models.UniqueConstraint(fields=('ingredient', 'recipe'),
+            models.UniqueConstraint(fields=('recipe', 'ingredient'),
                                     name='unique_ingredient_in_recipe'),
         )
         ordering = ('recipe', 'ingredient',)
@@ -135,7 +198,7 @@ class FavoriteShoppingCart(models.Model):
         User,
         on_delete=models.CASCADE,
         verbose_name='Пользователь',
-
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -170,3 +233,32 @@ class ShoppingCart(FavoriteShoppingCart):
         default_related_name = 'shopping_cart'
         verbose_name = 'Корзина покупок'
         verbose_name_plural = 'Корзины покупок'
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        db_index=False,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        default_related_name = 'shopping_list'
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+
+    def __str__(self):
+        return f'{self.user} :: {self.ingredient} {self.amount}'
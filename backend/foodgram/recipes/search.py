@@ -0,0 +1,104 @@
+"""Полнотекстовый поиск по названию, описанию и ингредиентам рецепта.
+
+На PostgreSQL используется колонка Recipe.search_vector с GIN-индексом
+и русской конфигурацией, на SQLite — виртуальная таблица FTS5, где rowid
+совпадает с id рецепта. Рецепт переиндексируется после фиксации
+транзакции, в которой он сохранён, — уже с ингредиентами, записанными в
+той же транзакции. Состав, изменённый без сохранения рецепта, попадает
+в индекс через rebuild_search_index.
+"""
+import re
+from functools import partial
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+INGREDIENT_NAMES = (
+    "SELECT {aggregate} FROM recipes_ingredientamount AS amount "
+    "JOIN recipes_ingredient AS ingredient "
+    "ON ingredient.id = amount.ingredient_id "
+    "WHERE amount.recipe_id = recipe.id"
+)
+
+POSTGRES_UPDATE = (
+    "UPDATE recipes_recipe AS recipe SET search_vector = "
+    "setweight(to_tsvector(%(config)s, recipe.name), 'A') || "
+    "setweight(to_tsvector(%(config)s, recipe.text), 'B') || "
+    "setweight(to_tsvector(%(config)s, coalesce(("
+    + INGREDIENT_NAMES.format(aggregate="string_agg(ingredient.name, ' ')")
+    + "), '')), 'C') WHERE recipe.id = ANY(%(ids)s)"
+)
+
+SQLITE_DELETE = f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({{ids}})'
+
+SQLITE_INSERT = (
+    f"INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) "
+    "SELECT recipe.id, recipe.name, recipe.text, coalesce(("
+    + INGREDIENT_NAMES.format(aggregate="group_concat(ingredient.name, ' ')")
+    + "), '') FROM recipes_recipe AS recipe WHERE recipe.id IN ({ids})"
+)
+
+
+def update_search_index(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_UPDATE,
+                           {'config': SEARCH_CONFIG, 'ids': recipe_ids})
+        elif connection.vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(recipe_ids))
+            cursor.execute(SQLITE_DELETE.format(ids=placeholders),
+                           recipe_ids)
+            cursor.execute(SQLITE_INSERT.format(ids=placeholders),
+                           recipe_ids)
+
+
+def schedule_search_index(recipe_id):
+    """Обновляет индекс рецепта после фиксации текущей транзакции."""
+    transaction.on_commit(partial(update_search_index, [recipe_id]))
+
+
+def remove_from_search_index(recipe_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(SQLITE_DELETE.format(ids='%s'), [recipe_id])
+
+
+def fts_query(text):
+    """Запрос FTS5 из слов пользователя: все слова по префиксу."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def search_recipes(queryset, text):
+    """Оставляет рецепты, подходящие под запрос, и сортирует по релевантности.
+
+    Релевантность доступна в аннотации ``search_rank``: чем больше, тем
+    лучше.
+    """
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+    else:
+        match = fts_query(text)
+        if not match:
+            return queryset.none()
+        table = Recipe._meta.db_table
+        queryset = queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'AND rowid = {table}.id',
+            (match,)))
+    return queryset.order_by('-search_rank', 'id')
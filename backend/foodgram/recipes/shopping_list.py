@@ -0,0 +1,119 @@
+"""Материализованные итоги списка покупок.
+
+Для каждого пользователя хранится сумма количеств по ингредиентам всех
+рецептов из его корзины. Функции модуля меняют итоги на разницу и
+должны вызываться в той же транзакции, что и изменение корзины или
+состава рецепта.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientAmount, ShoppingCart, ShoppingListItem
+from users.models import User
+
+
+def recipe_amounts(recipe_ids):
+    return Counter(dict(
+        IngredientAmount.objects.filter(recipe_id__in=recipe_ids)
+        .values_list('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    ))
+
+
+@transaction.atomic
+def change_totals(user_ids, deltas):
+    deltas = {ingredient_id: delta
+              for ingredient_id, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    list(User.objects.select_for_update().filter(pk__in=user_ids)
+         .order_by('pk').values_list('pk', flat=True))
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas)
+    }
+    created, updated, deleted = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    created.append(ShoppingListItem(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=delta))
+            elif item.amount + delta > 0:
+                item.amount += delta
+                updated.append(item)
+            else:
+                deleted.append(item.pk)
+    ShoppingListItem.objects.bulk_create(created)
+    ShoppingListItem.objects.bulk_update(updated, ('amount',))
+    if deleted:
+        ShoppingListItem.objects.filter(pk__in=deleted).delete()
+
+
+def add_recipes(user_id, recipe_ids):
+    change_totals([user_id], recipe_amounts(recipe_ids))
+
+
+def remove_recipes(user_id, recipe_ids):
+    change_totals([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(recipe_ids).items()
+    })
+
+
+def change_recipe(recipe_id, deltas):
+    if not any(deltas.values()):
+        return
+    user_ids = list(ShoppingCart.objects.filter(recipe_id=recipe_id)
+                    .values_list('user_id', flat=True))
+    change_totals(user_ids, deltas)
+
+
+def expected_totals(user_ids):
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in (
+            IngredientAmount.objects.filter(
+                recipe__shopping_cart__user_id__in=user_ids)
+            .values_list('recipe__shopping_cart__user_id', 'ingredient_id')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+    }
+
+
+def stored_totals(user_ids):
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in (
+            ShoppingListItem.objects.filter(user_id__in=user_ids)
+            .values_list('user_id', 'ingredient_id', 'amount')
+        )
+    }
+
+
+@transaction.atomic
+def rebuild(user_ids):
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                         amount=total)
+        for (user_id, ingredient_id), total
+        in expected_totals(user_ids).items()
+    )
+
+
+def inconsistent_users(user_ids):
+    expected = expected_totals(user_ids)
+    stored = stored_totals(user_ids)
+    return sorted({
+        user_id for user_id, ingredient_id in expected.keys() | stored.keys()
+        if expected.get((user_id, ingredient_id))
+        != stored.get((user_id, ingredient_id))
+    })
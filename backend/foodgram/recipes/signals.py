@@ -0,0 +1,121 @@
+from django.db.models import F
+from django.db.models.signals import (m2m_changed,
+                                      post_delete,
+                                      post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes import shopping_list
+from recipes.caches import ingredient_index, tag_catalog
+from recipes.images import schedule_variants
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import (remove_from_search_index, schedule_search_index,
+                            update_search_index)
+from users.models import User
+
+# Поля автора, которые входят в ответ с рецептом.
+AUTHOR_FIELDS = frozenset(('email', 'username', 'first_name', 'last_name'))
+
+
+def touch_recipes(recipes):
+    """Сдвигает updated_at, чтобы кеш карточек этих рецептов устарел."""
+    recipes.update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    shopping_list.change_recipe(instance.pk, {
+        ingredient_id: -amount
+        for ingredient_id, amount
+        in shopping_list.recipe_amounts([instance.pk]).items()
+    })
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_variants(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, **kwargs):
+    schedule_search_index(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    remove_from_search_index(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        update_search_index(instance.ingredientamount_set.values_list(
+            'recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=Tag)
+def touch_tag_recipes(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, update_fields,
+                         **kwargs):
+    if not created and (update_fields is None
+                        or AUTHOR_FIELDS.intersection(update_fields)):
+        touch_recipes(Recipe.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_catalog(sender, **kwargs):
+    tag_catalog.invalidate()
+
+
+def update_tags_mask(recipe_ids):
+    masks = dict.fromkeys(recipe_ids, 0)
+    for recipe_id, bit in Recipe.tags.through.objects.filter(
+            recipe_id__in=masks).values_list('recipe_id', 'tag__bit'):
+        masks[recipe_id] |= 1 << bit
+    updated_at = timezone.now()
+    Recipe.objects.bulk_update(
+        [Recipe(pk=recipe_id, tags_mask=mask, updated_at=updated_at)
+         for recipe_id, mask in masks.items()],
+        ('tags_mask', 'updated_at'))
+    return masks
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def sync_tags_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance.cleared_recipe_ids = list(
+            instance.recipes.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.tags_mask = update_tags_mask([instance.pk])[instance.pk]
+    elif action == 'post_clear':
+        update_tags_mask(instance.cleared_recipe_ids)
+    else:
+        update_tags_mask(pk_set)
+
+
+@receiver(pre_delete, sender=Tag)
+def remove_tag_from_masks(sender, instance, **kwargs):
+    Recipe.objects.filter(tags=instance).update(
+        tags_mask=F('tags_mask').bitand(~instance.mask),
+        updated_at=timezone.now())
@@ -7,25 +7,20 @@ from users.models import Follow, User
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name',
-                    'get_recipes_count', 'get_followers_count')
+                    'recipes_count', 'followers_count')
     search_fields = ('username', 'email')
-    list_filter = ('first_name', 'last_name')
+    list_filter = ('is_staff', 'is_active')
     ordering = ('username', )
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-    get_recipes_count.short_description = 'Количество рецептов'
-
-    def get_followers_count(self, obj):
-        return obj.recipeauthor.count()
-    get_followers_count.short_description = 'Количество подписок'
-
 
 @admin.register(Follow)
 class Follow(admin.ModelAdmin):
     list_display = ('recipe_author', 'follower')
-    search_fields = ('follower', 'recipe_author',)
-    list_filter = ('follower', 'recipe_author',)
+    list_select_related = ('recipe_author', 'follower')
+    search_fields = ('follower__username', 'recipe_author__username',)
+    autocomplete_fields = ('follower', 'recipe_author',)
     ordering = ('recipe_author', )
+    show_full_result_count = False
     empty_value_display = '-пусто-'
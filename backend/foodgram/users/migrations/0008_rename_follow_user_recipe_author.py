@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_alter_follow_options_alter_follow_user'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='follow',
+            name='unique_follow',
+        ),
+        migrations.RemoveConstraint(
+            model_name='follow',
+            name='unique_subscriptions',
+        ),
+        migrations.RenameField(
+            model_name='follow',
+            old_name='user',
+            new_name='recipe_author',
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='recipe_author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipeauthor', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('follower', 'recipe_author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(('follower', models.F('recipe_author')), _negated=True), name='unique_subscriptions'),
+        ),
+    ]
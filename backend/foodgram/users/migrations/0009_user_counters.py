@@ -0,0 +1,42 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def related_count(model, column):
+    return Coalesce(models.Subquery(
+        model.objects.filter(**{column: models.OuterRef('pk')})
+        .order_by().values(column)
+        .annotate(total=models.Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.update(
+        recipes_count=related_count(
+            apps.get_model('recipes', 'Recipe'), 'author'),
+        followers_count=related_count(
+            apps.get_model('users', 'Follow'), 'recipe_author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_rename_follow_user_recipe_author'),
+        ('recipes', '0014_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -25,6 +25,12 @@ class User(AbstractUser):
                                   max_length=MAX_USER_PARAMETRS)
     last_name = models.CharField('Фамилия',
                                  max_length=MAX_USER_PARAMETRS)
+    recipes_count = models.PositiveIntegerField('Количество рецептов',
+                                                default=0,
+                                                editable=False)
+    followers_count = models.PositiveIntegerField('Количество подписчиков',
+                                                  default=0,
+                                                  editable=False)
 
     class Meta:
         ordering = ('username', )
@@ -43,6 +49,7 @@ class Follow(models.Model):
     follower = models.ForeignKey(User,
                                  related_name='follower',
                                  verbose_name='Подписчик',
+                                 db_index=False,
                                  on_delete=models.CASCADE)
 
     class Meta: